@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Check that reused buffers remove the large allocations of a frame loop
+
+A chain of RemoveOffset, Window, Scale and OS-CFAR algorithms runs over a
+sequence of frames. After a warm-up frame, the memory allocated while
+processing the remaining frames is traced. With reused buffers no array
+of the size of a frame should be allocated anymore.
+"""
+# Standard libraries
+import time
+import tracemalloc
+import numpy as np
+# Local libraries
+import common
+import pyrads.pipeline
+
+
+def build_pipeline(frame_shape, **buffer_params):
+    """
+    Return the frame processing chain
+    """
+    chain = common.preprocessing(frame_shape, **buffer_params)
+    chain.append(common.scale(frame_shape, **buffer_params))
+    chain.append(common.oscfar(
+        frame_shape, 1, ordered_k=8, alpha=1.5, engine="vectorized",
+        **buffer_params))
+    return pyrads.pipeline.Pipeline(chain)
+
+
+def trace_frames(pipeline, frames):
+    """
+    Run the frames after a warm-up frame and trace the allocated memory
+
+    Returns the run time and the largest peak of memory allocated on top
+    of the memory in use before a frame.
+    """
+    pipeline(frames[0].copy())
+    tracemalloc.start()
+    run_time = 0
+    peak_memory = 0
+    for frame in frames[1:]:
+        # The frames are copied so that in-place stages do not alter them
+        frame_copy = frame.copy()
+        in_use = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        pipeline(frame_copy)
+        run_time += time.perf_counter() - start
+        frame_peak = tracemalloc.get_traced_memory()[1] - in_use
+        peak_memory = max(peak_memory, frame_peak)
+    tracemalloc.stop()
+    return run_time, peak_memory
+
+
+def main(frame_shape=(1, 1, 4, 128, 512), n_frames=20):
+    """
+    Main routine for the buffer reuse check
+
+    Frame shape: (1, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    frames = common.scene((n_frames,) + frame_shape[1:])[:, np.newaxis]
+    frame_size = frames[0].nbytes
+    print("Frame size: {:.1f} MiB".format(frame_size / 2**20))
+    results = {}
+    for name, buffer_params in (
+            ("default", {}),
+            ("reuse_buffers", {"reuse_buffers": True}),
+            ("reuse_buffers + in_place", {"reuse_buffers": True,
+                                          "in_place": True})):
+        pipeline = build_pipeline(frame_shape, **buffer_params)
+        run_time, peak_memory = trace_frames(pipeline, frames)
+        results[name] = pipeline(frames[-1].copy())[-1].copy()
+        print("{:>24}: {:.1f} ms/frame, peak new memory per frame "
+              "{:.2f} MiB".format(name, 1e3 * run_time / (n_frames-1),
+                                  peak_memory / 2**20))
+        if buffer_params and peak_memory > frame_size / 4:
+            raise RuntimeError(
+                "{} allocates {} bytes per frame after warm-up"
+                "".format(name, peak_memory))
+    match = all(np.array_equal(results["default"], result)
+                for result in results.values())
+    print("Outputs match: {}".format(match))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep of OS-CFAR with and without the stage output cache
+
+Only the CFAR parameters change between runs, so with the cache the
+offset removal, window and FFT run once for the whole sweep.
+"""
+# Standard libraries
+import itertools
+import time
+import numpy as np
+# Local libraries
+import common
+import pyrads.cache
+
+
+def sweep(pipeline, data, alphas, ordered_ks):
+    """
+    Run the pipeline for every combination of the CFAR parameters
+    """
+    results = []
+    profiler = pipeline.profile()
+    start = time.perf_counter()
+    for alpha, ordered_k in itertools.product(alphas, ordered_ks):
+        pipeline["OS-CFAR"].alpha = alpha
+        pipeline["OS-CFAR"].ordered_k = ordered_k
+        results.append(pipeline(data))
+    run_time = time.perf_counter() - start
+    profiler.detach()
+    return results, run_time, profiler.report()
+
+
+def main(in_shape=(4, 1, 4, 128, 256), n_targets=20):
+    """
+    Main routine for the cache sweep benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    data = common.scene(in_shape, n_targets)
+    alphas = np.linspace(0.2, 0.6, 20)
+    ordered_ks = (12, 16, 20, 24, 28)
+
+    reference, plain_time, plain_report = sweep(
+        common.detection_pipeline(in_shape), data, alphas, ordered_ks)
+    cache = pyrads.cache.ResultCache(max_bytes=2**28)
+    results, cached_time, cached_report = sweep(
+        common.detection_pipeline(in_shape, cache=cache), data, alphas,
+        ordered_ks)
+    if not all(np.array_equal(*pair) for pair in zip(reference, results)):
+        raise RuntimeError("Cached outputs differ from the computed ones")
+
+    print("{} runs".format(len(results)))
+    for label, run_time, report in (("Without cache", plain_time, plain_report),
+                                    ("With cache", cached_time, cached_report)):
+        calls = ", ".join("{} {}".format(name, stats["calls"])
+                          for name, stats in report["stages"].items())
+        print("{}: {:.2f} s, stage calls: {}".format(label, run_time, calls))
+    print("Cache: {}".format(cache.stats()))
+
+
+if __name__ == "__main__":
+    main()
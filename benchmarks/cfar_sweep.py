@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Batched OS-CFAR sweep over alpha and ordered_k
+
+A grid of settings is evaluated on a range-Doppler map, once by calling
+the detector for every setting and once with OSCFAR.sweep, which selects
+all the order statistics with one partition per window.
+"""
+# Standard libraries
+import itertools
+import time
+import numpy as np
+# Local libraries
+import pyrads.algms.ca_cfar
+import pyrads.algms.fft
+import pyrads.algms.os_cfar
+import pyrads.utils.synthetic
+
+
+def main(in_shape=(4, 1, 4, 128, 256), n_targets=20, n_alphas=20,
+         ordered_ks=(12, 16, 20, 24, 28)):
+    """
+    Main routine for the CFAR sweep benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    targets = pyrads.utils.synthetic.random_targets(
+        n_targets, in_shape[1:], seed=0)
+    data = pyrads.utils.synthetic.fmcw_cube(
+        in_shape, targets=targets, noise=0.05, clutter=0.1, seed=0)
+    range_fft_alg = pyrads.algms.fft.FFT(
+        in_shape,
+        type="range-doppler",
+        out_format="modulus"
+    )
+    rd_map = range_fft_alg(data)
+    alphas = np.linspace(0.2, 0.6, n_alphas)
+    oscfar_alg = pyrads.algms.os_cfar.OSCFAR(
+        rd_map.shape,
+        n_dims=2,
+        window_width=8,
+        n_guard_cells=2,
+        ordered_k=ordered_ks[0],
+        alpha=alphas[0]
+    )
+
+    start = time.perf_counter()
+    reference = np.zeros((len(ordered_ks), n_alphas), dtype=np.intp)
+    for (i, k), (j, alpha) in itertools.product(enumerate(ordered_ks),
+                                                enumerate(alphas)):
+        oscfar_alg.ordered_k = k
+        oscfar_alg.alpha = alpha
+        reference[i, j] = np.count_nonzero(oscfar_alg(rd_map))
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts = oscfar_alg.sweep(rd_map, alphas, ordered_ks, out_format="counts")
+    sweep_time = time.perf_counter() - start
+    if not np.array_equal(counts, reference):
+        raise RuntimeError("Sweep counts differ from the single runs")
+
+    print("OS-CFAR, {} settings".format(counts.size))
+    print("One run per setting: {:.2f} s, sweep: {:.2f} s ({:.0f}x)".format(
+        loop_time, sweep_time, loop_time / sweep_time))
+    print("Detections per setting (rows: ordered_k {}):".format(ordered_ks))
+    print(counts)
+
+    cacfar_alg = pyrads.algms.ca_cfar.CACFAR(
+        rd_map.shape,
+        n_dims=2,
+        window_width=8,
+        n_guard_cells=2,
+        alpha=alphas[0]
+    )
+    start = time.perf_counter()
+    for alpha in alphas:
+        cacfar_alg.alpha = alpha
+        cacfar_alg(rd_map)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cacfar_alg.sweep(rd_map, alphas, out_format="counts")
+    sweep_time = time.perf_counter() - start
+    print("CA-CFAR, {} settings".format(n_alphas))
+    print("One run per setting: {:.2f} s, sweep: {:.2f} s ({:.0f}x)".format(
+        loop_time, sweep_time, loop_time / sweep_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the benchmark scripts
+
+The stage builders hold the parameters used by all the benchmarks, which
+can be overridden per call. The scenes come from pyrads.utils.synthetic,
+and the timing helpers return the run time before the output.
+"""
+# Standard libraries
+import time
+import tracemalloc
+# Local libraries
+import pyrads.algms.dbscan
+import pyrads.algms.fft
+import pyrads.algms.os_cfar
+import pyrads.algms.remove_offset
+import pyrads.algms.scale
+import pyrads.algms.window
+import pyrads.pipeline
+import pyrads.utils.synthetic
+
+
+# Default OS-CFAR parameters for each number of dimensions
+OSCFAR_PARAMS = {
+    1: {"window_width": 16, "n_guard_cells": 2, "ordered_k": 6, "alpha": 0.2},
+    2: {"window_width": 8, "n_guard_cells": 2, "ordered_k": 20, "alpha": 0.4},
+}
+# Default noise, clutter and ADC offset of the synthetic scenes
+SCENE_PARAMS = {"noise": 0.05, "clutter": 0.1, "offset": 0.5}
+
+
+def preprocessing(in_shape, **params):
+    """
+    Return the offset removal and the Hann window along the samples
+    """
+    return [
+        pyrads.algms.remove_offset.RemoveOffset(in_shape, **params),
+        pyrads.algms.window.Window(
+            in_shape, axis=-1, window_type="hann", **params),
+    ]
+
+
+def scale(in_shape, **params):
+    """
+    Return a scaling by the maximum of every ramp
+    """
+    params = {"mode": "max", **params}
+    return pyrads.algms.scale.Scale(in_shape, **params)
+
+
+def range_fft(in_shape, **params):
+    params = {"type": "range", "out_format": "modulus", **params}
+    return pyrads.algms.fft.FFT(in_shape, **params)
+
+
+def range_doppler_fft(in_shape, **params):
+    params = {"type": "range-doppler", "out_format": "modulus", **params}
+    return pyrads.algms.fft.FFT(in_shape, **params)
+
+
+def oscfar(in_shape, n_dims, **params):
+    params = {**OSCFAR_PARAMS[n_dims], **params}
+    return pyrads.algms.os_cfar.OSCFAR(in_shape, n_dims=n_dims, **params)
+
+
+def dbscan(in_shape, **params):
+    params = {"n_dims": 2, "min_pts": 3, "epsilon": 1.5, **params}
+    return pyrads.algms.dbscan.DBSCAN(in_shape, **params)
+
+
+def detection_chain(in_shape, n_dims=2, clusters=False, **oscfar_params):
+    """
+    Return the algorithms of the offset removal, window, FFT and OS-CFAR
+    chain, followed by DBSCAN if clusters is set
+
+    The FFT is the range FFT for 1D detection and the range-Doppler FFT
+    for 2D detection.
+    """
+    fft_alg = range_fft(in_shape) if n_dims == 1 else range_doppler_fft(in_shape)
+    chain = preprocessing(in_shape) + [fft_alg]
+    chain.append(oscfar(fft_alg.out_data_shape, n_dims, **oscfar_params))
+    if clusters:
+        chain.append(dbscan(fft_alg.out_data_shape, n_dims=n_dims))
+    return chain
+
+
+def detection_pipeline(in_shape, n_dims=2, clusters=False, retain="final",
+                       cache=None, **oscfar_params):
+    """
+    Return a pipeline of the detection chain
+    """
+    return pyrads.pipeline.Pipeline(
+        detection_chain(in_shape, n_dims, clusters, **oscfar_params),
+        retain=retain,
+        cache=cache
+    )
+
+
+def scene_frames(frame_shape, n_frames, n_targets=20, seed=0, **params):
+    """
+    Yield the frames of a synthetic scene with random point targets
+
+    @frame_shape: (tx_antennas, rx_antennas, n_ramps, n_samples)
+    Other keyword arguments are the ones of pyrads.utils.synthetic.fmcw_frames.
+    """
+    targets = pyrads.utils.synthetic.random_targets(
+        n_targets, frame_shape, seed=seed)
+    params = {**SCENE_PARAMS, **params}
+    return pyrads.utils.synthetic.fmcw_frames(
+        frame_shape, n_frames, targets=targets, seed=seed, **params)
+
+
+def scene(shape, n_targets=20, seed=0, **params):
+    """
+    Return a cube of a synthetic scene with random point targets
+
+    @shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    targets = pyrads.utils.synthetic.random_targets(
+        n_targets, shape[1:], seed=seed)
+    params = {**SCENE_PARAMS, **params}
+    return pyrads.utils.synthetic.fmcw_cube(
+        shape, targets=targets, seed=seed, **params)
+
+
+def best_time(function, data, n_repeats=5, warm_up=False):
+    """
+    Return the shortest run time of several calls and the last output
+    """
+    if warm_up:
+        function(data)
+    run_times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        result = function(data)
+        run_times.append(time.perf_counter() - start)
+    return min(run_times), result
+
+
+def mean_time(function, data, n_runs):
+    """
+    Return the mean time per call, after a warm-up call
+    """
+    function(data)
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        function(data)
+    return (time.perf_counter() - start) / n_runs
+
+
+def measure(function, data, n_repeats=5, warm_up=False):
+    """
+    Return the shortest run time, the peak memory allocated by a call and
+    the output
+
+    The memory is traced on an extra call, so it does not slow the timed
+    ones down.
+    """
+    run_time, _ = best_time(function, data, n_repeats, warm_up)
+    tracemalloc.start()
+    result = function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return run_time, peak, result
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+1D and 2D detection from the same windowed cube
+
+The two detection chains run once as separate pipelines, which compute
+the offset removal and the window twice, and once as the branches of a
+DAG pipeline sharing that prefix.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.dag
+import pyrads.pipeline
+
+
+def build_chains(in_shape):
+    """
+    Return the shared prefix and the 1D and 2D detection branches
+    """
+    chain_1d = common.detection_chain(in_shape, n_dims=1)
+    chain_2d = common.detection_chain(in_shape, n_dims=2)
+    return chain_1d[:2], chain_1d[2:], chain_2d[2:]
+
+
+def main(in_shape=(8, 1, 4, 128, 256), n_targets=20):
+    """
+    Main routine for the DAG benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    data = common.scene(in_shape, n_targets)
+
+    prefix, branch_1d, branch_2d = build_chains(in_shape)
+    pipeline_1d = pyrads.pipeline.Pipeline(prefix + branch_1d, retain="final")
+    prefix, branch_1d, branch_2d = build_chains(in_shape)
+    pipeline_2d = pyrads.pipeline.Pipeline(prefix + branch_2d, retain="final")
+    separate = lambda data: (pipeline_1d(data), pipeline_2d(data))
+    separate_time, separate_peak, (reference_1d, reference_2d) = (
+        common.measure(separate, data))
+
+    prefix, branch_1d, branch_2d = build_chains(in_shape)
+    dag = pyrads.dag.DAGPipeline(prefix)
+    window_id = [*dag._algorithms][-1]
+    dag.add(branch_1d, after=window_id)
+    dag.add(branch_2d, after=window_id)
+    dag_time, dag_peak, outputs = common.measure(dag, data)
+    output_1d, output_2d = outputs.values()
+    if not (np.array_equal(output_1d, reference_1d)
+            and np.array_equal(output_2d, reference_2d)):
+        raise RuntimeError("DAG outputs differ from the separate pipelines")
+
+    print("Nodes: {}".format(", ".join(
+        "{} <- {}".format(node, after) for node, after in dag._inputs.items())))
+    print("Outputs: {}".format(list(outputs)))
+    print("Separate pipelines: {:.1f} ms, peak {:.1f} MiB".format(
+        separate_time*1e3, separate_peak / 2**20))
+    print("DAG pipeline: {:.1f} ms, peak {:.1f} MiB".format(
+        dag_time*1e3, dag_peak / 2**20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Compare the real-input and the complex-input paths of the FFT algorithm
+
+The same ADC samples are given once as real data and once as complex
+data with a zero imaginary part, so both paths produce the same spectrum.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.fft
+
+
+def time_fft(data, n_repeats=5, **fft_params):
+    """
+    Return the best run time of the FFT and its output
+    """
+    fft_alg = pyrads.algms.fft.FFT(data.shape, **fft_params)
+    return common.best_time(fft_alg, data, n_repeats)
+
+
+def main(data_shape=(20, 1, 4, 128, 512)):
+    """
+    Main routine for the FFT benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    adc_data = common.scene(data_shape)
+    for fft_type in ("range", "range-doppler"):
+        real_time, real_result = time_fft(adc_data, type=fft_type)
+        complex_time, complex_result = time_fft(
+            adc_data.astype(complex), type=fft_type)
+        match = np.allclose(real_result, complex_result)
+        print("{:>14}: complex {:.3f} s, real {:.3f} s, speed-up {:.2f}x, "
+              "match: {}".format(fft_type, complex_time, real_time,
+                                 complex_time / real_time, match))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Cost of reading single outputs of a pipeline
+
+The range-Doppler map of one frame is read from a pipeline that keeps
+all the outputs and from a lazy one, which only runs the stages and the
+frames that are indexed.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+
+
+def main(in_shape=(20, 1, 4, 128, 256), n_targets=20, frame_n=7):
+    """
+    Main routine for the lazy outputs benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    data = common.scene(in_shape, n_targets)
+    pipeline = common.detection_pipeline(in_shape, retain="all")
+    lazy_pipeline = common.detection_pipeline(in_shape, retain="lazy")
+
+    all_time, reference = common.best_time(pipeline, data, 1)
+    frame_time, fft_frame = common.best_time(
+        lambda data: lazy_pipeline(data)["FFT", frame_n], data, 1)
+    fft_time, fft_out = common.best_time(
+        lambda data: lazy_pipeline(data)[-2], data, 1)
+    if not (np.array_equal(fft_frame, reference[-2][frame_n])
+            and np.array_equal(fft_out, reference[-2])):
+        raise RuntimeError("Lazy outputs differ from the full run")
+
+    print("All stages and frames: {:.1f} ms".format(all_time*1e3))
+    print("FFT output, all frames: {:.1f} ms".format(fft_time*1e3))
+    print("FFT output, frame {}: {:.1f} ms".format(frame_n, frame_time*1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the OS-CFAR engines over a range of window widths
+
+The sliding engines have a cost per cell that depends on the cells
+entering and leaving the window, while the partition of the vectorized
+engine grows with the number of training cells. The thresholds used by
+the 'auto' engine are taken from the crossing points of this benchmark.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.os_cfar
+
+
+def time_engine(data, engine, n_repeats=3, **oscfar_params):
+    """
+    Return the best run time of an engine and its output
+    """
+    oscfar_alg = pyrads.algms.os_cfar.OSCFAR(
+        data.shape,
+        engine=engine,
+        **oscfar_params
+    )
+    return common.best_time(oscfar_alg, data, n_repeats)
+
+
+def main(data_shape=(20, 1, 1, 256, 256), n_guard_cells=2):
+    """
+    Main routine for the OS-CFAR engines benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    rng = np.random.default_rng(0)
+    float_data = rng.rayleigh(size=data_shape)
+    # Quantized version of the same data, e.g. from a fixed-point FFT
+    int_data = (float_data*20).astype(np.int16)
+    print("{:>8} {:>8} {:>8} {:>12} {:>12} {:>12} {:>11}".format(
+        "dtype", "width", "k", "vectorized", "sliding", "histogram", "auto"))
+    for data in (float_data, int_data):
+        for window_width in (16, 32, 64, 128, 192, 256):
+            oscfar_params = {
+                "n_dims": 1,
+                "window_width": window_width,
+                "ordered_k": window_width // 4,
+                "alpha": 0.5,
+                "n_guard_cells": n_guard_cells,
+            }
+            engines = ["vectorized", "sliding"]
+            if np.issubdtype(data.dtype, np.integer):
+                engines.append("histogram")
+            run_times = {}
+            reference = None
+            for engine in engines:
+                run_times[engine], result = time_engine(
+                    data, engine, **oscfar_params)
+                if reference is None:
+                    reference = result
+                elif not np.array_equal(reference, result):
+                    raise RuntimeError("{} engine differs from the vectorized "
+                                       "engine".format(engine))
+            auto_alg = pyrads.algms.os_cfar.OSCFAR(
+                data.shape, **oscfar_params)
+            auto_engine = auto_alg.select_engine(
+                data, auto_alg.training_mask_1d().reshape(1, -1))
+            print("{:>8} {:>8} {:>8} {:>12.4f} {:>12.4f} {:>12} {:>11}".format(
+                data.dtype.name,
+                window_width,
+                oscfar_params["ordered_k"],
+                run_times["vectorized"],
+                run_times["sliding"],
+                "{:.4f}".format(run_times["histogram"])
+                    if "histogram" in run_times else "-",
+                auto_engine
+            ))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Scaling of the process pool executor from 1 to N worker processes
+
+A synthetic scene of point targets goes through a range-Doppler, OS-CFAR
+and DBSCAN pipeline. The efficiency with n workers is the single
+process time divided by n times the time with n workers.
+
+A 1D OS-CFAR pipeline checks that stages using statistics of the whole
+input, here the padding of the 1D CFAR, match a serial run chunk by chunk.
+"""
+# Standard libraries
+import os
+import numpy as np
+# Local libraries
+import common
+import pyrads.parallel
+
+
+def check_chunked(adc_data, n_workers):
+    """
+    Compare the 1D CFAR pipeline with serial runs over the same chunks
+
+    Return the number of cells that differ from a single serial run over
+    all the frames.
+    """
+    pipeline = common.detection_pipeline((1,) + adc_data.shape[1:], n_dims=1)
+    with pyrads.parallel.ProcessExecutor(pipeline, n_workers) as executor:
+        result = executor(adc_data)
+        limits = executor.chunk_limits(adc_data.shape[0])
+    reference = np.concatenate(
+        [pipeline(adc_data[start:stop]) for start, stop in limits])
+    if not np.array_equal(result, reference):
+        raise RuntimeError("Parallel output differs from the chunked one")
+    return np.count_nonzero(result != pipeline(adc_data))
+
+
+def main(data_shape=(64, 1, 4, 128, 256), max_workers=None):
+    """
+    Main routine for the scaling benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    max_workers = max_workers or os.cpu_count()
+    adc_data = common.scene(data_shape)
+    pipeline = common.detection_pipeline((1,) + data_shape[1:], clusters=True)
+    serial_time, reference = common.best_time(pipeline, adc_data, 1)
+    print("Serial pipeline: {:.2f} s".format(serial_time))
+    print("{:>8} {:>8} {:>9} {:>11}".format(
+        "workers", "time", "speed-up", "efficiency"))
+    single_time = None
+    for n_workers in range(1, max_workers+1):
+        with pyrads.parallel.ProcessExecutor(pipeline, n_workers) as executor:
+            # Warm the pool up, so the process start-up is not timed
+            executor(adc_data[:n_workers])
+            run_time, result = common.best_time(executor, adc_data, 1)
+        if not np.array_equal(result, reference):
+            raise RuntimeError("Parallel output differs from the serial one")
+        single_time = single_time or run_time
+        print("{:>8} {:>8.2f} {:>9.2f} {:>11.2f}".format(
+            n_workers, run_time, single_time / run_time,
+            single_time / (n_workers * run_time)))
+    n_changed = check_chunked(adc_data, max_workers)
+    print("1D CFAR: output matches the serial run per chunk, {} cells differ "
+          "from a single serial run".format(n_changed))
+    return
+
+
+if __name__ == "__main__":
+    main()
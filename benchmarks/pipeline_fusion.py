@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Speed of a compiled pipeline on full scenes
+
+The offset removal, window and scaling stages are fused by
+Pipeline.compile, and the result is compared with the pipeline as built,
+also after changing a parameter of a fused stage.
+The fused stages are also timed for several block sizes.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.fused
+import pyrads.pipeline
+
+
+def build_pipeline(in_shape):
+    """
+    Return the full scene processing chain
+    """
+    chain = common.preprocessing(in_shape) + [common.scale(in_shape)]
+    range_fft_alg = common.range_fft(in_shape)
+    chain.append(range_fft_alg)
+    chain.append(common.oscfar(range_fft_alg.out_data_shape, 1,
+                               window_width=8, ordered_k=3, alpha=0.5))
+    return pyrads.pipeline.Pipeline(chain, retain="final")
+
+
+def check_parameter_change(pipeline, compiled, data):
+    """
+    Check that the compiled pipeline follows a change of a fused stage
+    """
+    scale_alg = pipeline["Scale"]
+    scale_alg.mode, scale_alg.scaling_factor = "fixed", 4
+    try:
+        if not np.array_equal(pipeline(data), compiled(data)):
+            raise RuntimeError("Compiled pipeline ignores a parameter change")
+    finally:
+        scale_alg.mode = "max"
+
+
+def main(in_shape=(20, 1, 4, 128, 512), n_runs=5,
+         block_sizes=(2**16, 2**18, 2**19, 2**20, 2**22)):
+    """
+    Main routine for the pipeline fusion benchmark
+
+    Input shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    for dtype in (np.float64, np.float32):
+        data = common.scene(in_shape, dtype=dtype)
+        pipeline = build_pipeline(in_shape)
+        compiled = pipeline.compile()
+        if not np.array_equal(pipeline(data), compiled(data)):
+            raise RuntimeError("Compiled outputs differ from the original ones")
+        check_parameter_change(pipeline, compiled, data)
+        # Shortest run time in ms, after a warm-up run
+        run_ms = lambda function: 1e3 * common.best_time(
+            function, data, n_runs, warm_up=True)[0]
+        print("{} input, fused stages: {}".format(
+            np.dtype(dtype).name, compiled.fused))
+        print("Full pipeline: {:.1f} ms, compiled: {:.1f} ms".format(
+            run_ms(pipeline), run_ms(compiled)))
+
+        # Only the elementwise stages, for several block sizes
+        elementwise = pyrads.pipeline.Pipeline(
+            [*pipeline._algorithms.values()][:3], retain="final")
+        fused = elementwise.compile()
+        print("Elementwise stages: {:.1f} ms".format(
+            run_ms(elementwise)))
+        default_block = pyrads.algms.fused.BLOCK_BYTES
+        for block_bytes in block_sizes:
+            pyrads.algms.fused.BLOCK_BYTES = block_bytes
+            print("  fused, {:>5} KiB blocks: {:.1f} ms".format(
+                block_bytes // 1024, run_ms(fused)))
+        pyrads.algms.fused.BLOCK_BYTES = default_block
+
+
+if __name__ == "__main__":
+    main()
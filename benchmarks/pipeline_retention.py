@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Peak memory of a pipeline run under each retention policy
+"""
+# Standard libraries
+import tracemalloc
+import numpy as np
+# Local libraries
+import common
+import pyrads.pipeline
+
+
+def build_chain(data_shape):
+    """
+    Return the algorithms of a full-scene processing chain
+    """
+    range_fft_alg = common.range_doppler_fft(data_shape)
+    fft_shape = range_fft_alg.out_data_shape
+    return common.preprocessing(data_shape) + [
+        range_fft_alg,
+        common.scale(fft_shape),
+        common.oscfar(fft_shape, 1, ordered_k=8, alpha=1.5),
+    ]
+
+
+def main(data_shape=(20, 1, 4, 128, 512)):
+    """
+    Main routine for the retention benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    adc_data = common.scene(data_shape)
+    print("Input cube: {:.1f} MiB".format(adc_data.nbytes / 2**20))
+    results = {}
+    for retain in ("all", "final", ["FFT"]):
+        pipeline = pyrads.pipeline.Pipeline(
+            build_chain(data_shape), retain=retain)
+        tracemalloc.start()
+        result = pipeline(adc_data)
+        retained_memory, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[str(retain)] = result
+        print("{:>9}: peak {:6.1f} MiB, retained {:6.1f} MiB".format(
+            str(retain), peak_memory / 2**20, retained_memory / 2**20))
+        del pipeline, result
+    final_match = (np.array_equal(results["all"][-1], results["final"])
+                   and np.array_equal(results["all"][-1],
+                                      results["['FFT']"]["OS-CFAR"]))
+    print("Outputs match: {}".format(final_match))
+    return
+
+
+if __name__ == "__main__":
+    main()
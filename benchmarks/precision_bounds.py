@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed of the single precision mode against double precision
+
+Every stage runs on the same input in float64 and float32 and its
+outputs are compared with the bounds below. Numeric outputs are compared
+through the maximum error relative to the largest reference value, and
+detections through the fraction of cells that change.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.ca_cfar
+import pyrads.algms.fft
+import pyrads.algms.os_cfar
+import pyrads.algms.remove_offset
+import pyrads.algms.scale
+import pyrads.algms.window
+import pyrads.algms.windowed_fft
+
+
+# Maximum relative error of numeric outputs
+VALUE_BOUNDS = {
+    "RemoveOffset": 1e-6,
+    "Window": 1e-6,
+    "Scale": 1e-6,
+    "FFT range": 1e-5,
+    "FFT range-doppler": 1e-5,
+    "WindowedFFT": 1e-5,
+}
+# Maximum fraction of cells with a different detection
+DETECTION_BOUNDS = {
+    "OS-CFAR 1D": 1e-4,
+    "OS-CFAR 2D": 1e-4,
+    "CA-CFAR 2D": 1e-4,
+}
+
+
+def build_stages(adc_shape, rdm_shape):
+    """
+    Return the stages to compare, with the input type each one takes
+    """
+    cfar_params = {
+        "window_width": 8,
+        "n_guard_cells": 2,
+        "alpha": 0.7,
+    }
+    stages = {
+        "RemoveOffset": (
+            "adc",
+            lambda **kw: pyrads.algms.remove_offset.RemoveOffset(
+                adc_shape, **kw)),
+        "Window": (
+            "adc",
+            lambda **kw: pyrads.algms.window.Window(
+                adc_shape, axis=-1, window_type="hann", **kw)),
+        "Scale": (
+            "adc",
+            lambda **kw: pyrads.algms.scale.Scale(
+                adc_shape, mode="max", **kw)),
+        "FFT range": (
+            "adc",
+            lambda **kw: pyrads.algms.fft.FFT(
+                adc_shape, type="range", **kw)),
+        "FFT range-doppler": (
+            "adc",
+            lambda **kw: pyrads.algms.fft.FFT(
+                adc_shape, type="range-doppler", **kw)),
+        "WindowedFFT": (
+            "adc",
+            lambda **kw: pyrads.algms.windowed_fft.WindowedFFT(
+                adc_shape, type="range-doppler", **kw)),
+        "OS-CFAR 1D": (
+            "rdm",
+            lambda **kw: pyrads.algms.os_cfar.OSCFAR(
+                rdm_shape, n_dims=1, ordered_k=3, **cfar_params, **kw)),
+        "OS-CFAR 2D": (
+            "rdm",
+            lambda **kw: pyrads.algms.os_cfar.OSCFAR(
+                rdm_shape, n_dims=2, ordered_k=20, **cfar_params, **kw)),
+        "CA-CFAR 2D": (
+            "rdm",
+            lambda **kw: pyrads.algms.ca_cfar.CACFAR(
+                rdm_shape, n_dims=2, **cfar_params, **kw)),
+    }
+    return stages
+
+
+def compare(reference, result):
+    """
+    Return the relative error, or the fraction of changed detections
+    """
+    if reference.dtype == bool:
+        return np.mean(reference != result)
+    error = np.abs(reference - result).max()
+    return error / np.abs(reference).max()
+
+
+def main(adc_shape=(10, 1, 4, 128, 512)):
+    """
+    Main routine for the precision benchmark
+
+    ADC shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    # 12 bit ADC samples of a few targets over noise
+    scene = common.scene(adc_shape, n_targets=3, noise=0.1, offset=0)
+    adc_data = np.clip(np.round(scene * 500), -2048, 2047).astype(np.int16)
+    range_doppler = pyrads.algms.fft.FFT(adc_shape, type="range-doppler")
+    rdm_data = range_doppler(adc_data)
+    inputs = {"adc": adc_data, "rdm": rdm_data}
+
+    print("{:>18} {:>10} {:>10} {:>10} {:>10}".format(
+        "stage", "error", "bound", "float64", "float32"))
+    failed = []
+    stages = build_stages(adc_shape, rdm_data.shape)
+    for name, (input_name, build) in stages.items():
+        data = inputs[input_name]
+        double_alg = build()
+        single_alg = build(dtype=np.float32)
+        error = compare(double_alg(data), single_alg(data))
+        bound = VALUE_BOUNDS.get(name, DETECTION_BOUNDS.get(name))
+        # Time both precisions from an input already in that precision
+        double_time, _ = common.best_time(
+            double_alg, data.astype(np.float64), 3)
+        single_time, _ = common.best_time(
+            single_alg, data.astype(np.float32), 3)
+        print("{:>18} {:>10.2e} {:>10.0e} {:>10.4f} {:>10.4f}".format(
+            name, error, bound, double_time, single_time))
+        if error > bound:
+            failed.append(name)
+    if failed:
+        raise RuntimeError("Accuracy bounds exceeded: {}".format(failed))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Cost of the per-stage profiler
+
+A range-Doppler, OS-CFAR and DBSCAN chain runs on single frames without
+profiler, with the timing profiler and with memory tracking. The report
+of the last run is printed as a table and as JSON.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.identity
+import pyrads.pipeline
+
+
+def main(frame_shape=(1, 1, 4, 128, 256), n_runs=50):
+    """
+    Main routine for the profiling benchmark
+
+    Frame shape: (1, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    frame = common.scene(frame_shape)
+    pipeline = common.detection_pipeline(frame_shape, clusters=True)
+
+    # Fixed cost of a call without and with hooks, on a stage doing nothing
+    identity_alg = pyrads.algms.identity.Identity(in_data_shape=(1,))
+    small = np.zeros(1)
+    bare_time = common.mean_time(identity_alg, small, 10000)
+    profiler = pyrads.pipeline.Pipeline([identity_alg]).profile()
+    hooked_time = common.mean_time(identity_alg, small, 10000)
+    profiler.detach()
+    print("Stage call: {:.2f} us without profiler, {:.2f} us with it".format(
+        bare_time*1e6, hooked_time*1e6))
+
+    plain_time = common.mean_time(pipeline, frame, n_runs)
+    profiler = pipeline.profile()
+    timed_time = common.mean_time(pipeline, frame, n_runs)
+    profiler.detach()
+    profiler = pipeline.profile(memory=True)
+    memory_time = common.mean_time(pipeline, frame, n_runs)
+    profiler.detach()
+    print("Frame: {:.2f} ms without profiler, {:.2f} ms with timing, "
+          "{:.2f} ms with memory tracking".format(
+              plain_time*1e3, timed_time*1e3, memory_time*1e3))
+    print()
+    print(profiler)
+    print()
+    print(profiler.to_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of the stage-parallel executor
+
+Frames go one by one through a range-Doppler, OS-CFAR and DBSCAN chain,
+first sequentially with Pipeline.stream and then with every stage in its
+own thread.
+"""
+# Standard libraries
+import time
+import numpy as np
+# Local libraries
+import common
+import pyrads.parallel
+
+
+def main(frame_shape=(1, 1, 4, 128, 256), n_frames=50, queue_size=2):
+    """
+    Main routine for the stage-parallel benchmark
+
+    Frame shape: (1, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    # Frames with a leading axis of size 1, as the pipeline input
+    frames = common.scene((n_frames,) + frame_shape[1:])[:, np.newaxis]
+    pipeline = common.detection_pipeline(frame_shape, clusters=True)
+
+    start = time.perf_counter()
+    reference = list(pipeline.stream(frames, chunk=1))
+    serial_time = time.perf_counter() - start
+
+    executor = pyrads.parallel.StageExecutor(pipeline, queue_size)
+    start = time.perf_counter()
+    results = list(executor.stream(iter(frames)))
+    stage_time = time.perf_counter() - start
+    if not all(np.array_equal(*pair) for pair in zip(reference, results)):
+        raise RuntimeError("Stage-parallel outputs differ from the serial ones")
+
+    stats = executor.stats()
+    print("Sequential: {:.1f} frames/s".format(n_frames / serial_time))
+    print("Stage-parallel: {:.1f} frames/s, latency mean {:.1f} ms, "
+          "p95 {:.1f} ms, max {:.1f} ms".format(
+              n_frames / stage_time, 1e3 * stats["latency_mean"],
+              1e3 * stats["latency_p95"], 1e3 * stats["latency_max"]))
+    print("{:>14} {:>10} {:>11} {:>10}".format(
+        "stage", "busy (s)", "mean depth", "max depth"))
+    for name, stage_stats in stats["stages"].items():
+        print("{:>14} {:>10.3f} {:>11.2f} {:>10}".format(
+            name, stage_stats["busy_time"], stage_stats["queue_depth_mean"],
+            stage_stats["queue_depth_max"]))
+    return
+
+
+if __name__ == "__main__":
+    main()
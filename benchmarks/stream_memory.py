@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Peak memory of Pipeline.stream over recordings of increasing length
+
+Frames are produced one by one by a generator, as they would be read
+from a sensor or an HDF5 dataset, so the recording never exists as a
+whole in memory.
+"""
+# Standard libraries
+import time
+import tracemalloc
+import numpy as np
+# Local libraries
+import common
+
+
+def main(frame_shape=(1, 4, 128, 256), chunk=8):
+    """
+    Main routine for the streaming benchmark
+
+    Frame shape: (tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    frame_size = np.zeros(frame_shape).nbytes
+    print("Frame size: {:.1f} MiB, chunk: {} frames".format(
+        frame_size / 2**20, chunk))
+    for n_frames in (20, 80, 320):
+        pipeline = common.detection_pipeline(
+            (chunk,) + frame_shape, alpha=0.5, out_format="sparse")
+        tracemalloc.start()
+        start = time.perf_counter()
+        n_detections = 0
+        for detections in pipeline.stream(
+                common.scene_frames(frame_shape, n_frames), chunk=chunk):
+            n_detections += len(detections)
+        run_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("{:>4} frames ({:6.1f} MiB): {:.2f} s, peak {:.1f} MiB, "
+              "{} detections".format(
+                  n_frames, n_frames * frame_size / 2**20, run_time,
+                  peak_memory / 2**20, n_detections))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the algorithms and pipelines over a grid of sizes
+
+Every case runs on synthetic FMCW frames, so the results do not depend on
+the recorded datasets. The throughput and the peak memory of each case
+can be stored as a baseline and compared with a later run:
+
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --compare baseline.json
+"""
+# Standard libraries
+import argparse
+import json
+import platform
+import sys
+import numpy as np
+# Local libraries
+import common
+import pyrads.pipeline
+
+
+# Frame sizes, as (n_ramps, n_samples)
+SIZES = ((64, 128), (128, 256), (128, 512), (256, 512))
+# Relative change of the run time reported as a regression or improvement
+TOLERANCE = 0.1
+
+
+def build_cases(in_shape):
+    """
+    Return the benchmark cases for an input shape
+
+    Every case is a pair of the callable and its input, given as the
+    number of stages of the 2D pipeline run before it, or 'range' for the
+    range spectrum.
+    """
+    rd_shape = common.range_doppler_fft(in_shape).out_data_shape
+    range_shape = common.range_fft(in_shape).out_data_shape
+    pipeline_1d = common.detection_chain(in_shape, n_dims=1)
+    pipeline_2d = common.detection_chain(in_shape, n_dims=2, clusters=True)
+    remove_offset_alg, window_alg = common.preprocessing(in_shape)
+    cases = {
+        "RemoveOffset": (remove_offset_alg, 0),
+        "Window": (window_alg, 1),
+        "FFT range": (common.range_fft(in_shape), 2),
+        "FFT range-doppler": (common.range_doppler_fft(in_shape), 2),
+        "OSCFAR 1D": (common.oscfar(range_shape, 1), "range"),
+        "OSCFAR 2D": (common.oscfar(rd_shape, 2), 3),
+        "DBSCAN": (common.dbscan(rd_shape), 4),
+        "Pipeline 1D": (pyrads.pipeline.Pipeline(
+            pipeline_1d, retain="final"), 0),
+        "Pipeline 2D": (pyrads.pipeline.Pipeline(
+            pipeline_2d, retain="final"), 0),
+    }
+    return cases, pipeline_2d
+
+
+def run_suite(n_frames=4, n_targets=20, n_repeats=5, sizes=SIZES):
+    """
+    Return the results of all cases, keyed by 'case @ n_ramps x n_samples'
+    """
+    results = {}
+    for n_ramps, n_samples in sizes:
+        in_shape = (n_frames, 1, 4, n_ramps, n_samples)
+        cube = common.scene(in_shape, n_targets)
+        cases, pipeline_2d = build_cases(in_shape)
+        # Inputs of the later stages, from the stages before them
+        stage_inputs = [cube]
+        for alg in pipeline_2d:
+            stage_inputs.append(alg(stage_inputs[-1]))
+        stage_inputs = {n: data for n, data in enumerate(stage_inputs)}
+        stage_inputs["range"] = cases["FFT range"][0](stage_inputs[2])
+        for name, (function, stage) in cases.items():
+            data = stage_inputs[stage]
+            run_time, peak, _ = common.measure(
+                function, data, n_repeats, warm_up=True)
+            key = "{} @ {}x{}".format(name, n_ramps, n_samples)
+            results[key] = {
+                "time": run_time,
+                "frames_per_s": n_frames / run_time,
+                "mbytes_per_s": getattr(data, "nbytes", 0) / run_time / 1e6,
+                "peak_bytes": peak,
+            }
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Print the change of every case against the baseline
+
+    Return the keys of the cases that got slower than the tolerance.
+    """
+    regressions = []
+    print("{:<32}{:>12}{:>12}{:>9}{:>14}".format(
+        "Case", "Base (ms)", "Now (ms)", "Ratio", "Peak (MiB)"))
+    for key, result in results.items():
+        if key not in baseline:
+            print("{:<32}{:>12}{:>12.2f}{:>9}{:>14.2f}".format(
+                key, "-", result["time"]*1e3, "new",
+                result["peak_bytes"] / 2**20))
+            continue
+        ratio = result["time"] / baseline[key]["time"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  slower"
+            regressions.append(key)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print("{:<32}{:>12.2f}{:>12.2f}{:>9.2f}{:>14.2f}{}".format(
+            key, baseline[key]["time"]*1e3, result["time"]*1e3, ratio,
+            result["peak_bytes"] / 2**20, flag))
+    return regressions
+
+
+def main(save=None, baseline=None, n_frames=4, n_repeats=5,
+         tolerance=TOLERANCE):
+    """
+    Main routine for the benchmark suite
+
+    @save: Path of a JSON file to store the results in
+    @baseline: Path of a JSON file with the results to compare with
+    @tolerance: Relative change of the run time reported as a regression
+
+    Return 1 if any case got slower than the baseline, 0 otherwise.
+    """
+    results = run_suite(n_frames=n_frames, n_repeats=n_repeats)
+    if baseline is not None:
+        with open(baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        regressions = compare(results, stored["results"], tolerance)
+        print("{} of {} cases slower than the baseline".format(
+            len(regressions), len(results)))
+    else:
+        regressions = []
+        print("{:<32}{:>12}{:>12}{:>12}{:>14}".format(
+            "Case", "Time (ms)", "Frames/s", "MB/s", "Peak (MiB)"))
+        for key, result in results.items():
+            print("{:<32}{:>12.2f}{:>12.1f}{:>12.1f}{:>14.2f}".format(
+                key, result["time"]*1e3, result["frames_per_s"],
+                result["mbytes_per_s"], result["peak_bytes"] / 2**20))
+    if save is not None:
+        stored = {
+            "machine": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "n_frames": n_frames,
+            "results": results,
+        }
+        with open(save, "w") as save_file:
+            json.dump(stored, save_file, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--save", help="store the results in a JSON file")
+    parser.add_argument("--compare", help="JSON file of a stored baseline")
+    parser.add_argument("--frames", type=int, default=4,
+                        help="frames per run")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="timed runs per case")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+    sys.exit(main(args.save, args.compare, args.frames, args.repeats,
+                  args.tolerance))
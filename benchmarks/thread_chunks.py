@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Run time of the thread executor over chunk sizes and worker counts
+
+The pipeline only holds NumPy-heavy stages, which release the GIL. The
+default chunk size is the one given by pyrads.parallel.CHUNK_BYTES.
+"""
+# Standard libraries
+import os
+import numpy as np
+# Local libraries
+import common
+import pyrads.parallel
+import pyrads.pipeline
+
+
+def build_pipeline(data_shape):
+    """
+    Return a pipeline of NumPy-heavy stages
+    """
+    range_fft_alg = common.range_fft(data_shape)
+    chain = common.preprocessing(data_shape) + [
+        range_fft_alg, common.scale(range_fft_alg.out_data_shape)]
+    return pyrads.pipeline.Pipeline(chain, retain="final")
+
+
+def main(data_shape=(32, 1, 4, 128, 512), max_workers=None):
+    """
+    Main routine for the thread executor benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    max_workers = max_workers or os.cpu_count()
+    adc_data = common.scene(data_shape)
+    pipeline = build_pipeline(data_shape)
+    serial_time, reference = common.best_time(pipeline, adc_data, 3)
+    print("Serial pipeline: {:.3f} s".format(serial_time))
+    print("{:>8} {:>8} {:>8} {:>9}".format(
+        "workers", "chunk", "time", "speed-up"))
+    for n_workers in sorted({1, max_workers}):
+        for chunk in (None, 16, 256, 4096):
+            with pyrads.parallel.ThreadExecutor(
+                    pipeline, n_workers, chunk) as executor:
+                run_time, result = common.best_time(executor, adc_data, 3)
+            if not np.allclose(result, reference):
+                raise RuntimeError("Threaded output differs from the serial one")
+            print("{:>8} {:>8} {:>8.3f} {:>9.2f}".format(
+                n_workers, str(chunk or "auto"), run_time,
+                serial_time / run_time))
+    return
+
+
+if __name__ == "__main__":
+    main()
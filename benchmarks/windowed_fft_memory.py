@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Compare the peak memory of the Window + FFT stages and the fused stage
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import common
+import pyrads.algms.fft
+import pyrads.algms.window
+import pyrads.algms.windowed_fft
+
+
+def main(data_shape=(20, 1, 4, 128, 512)):
+    """
+    Main routine for the windowed FFT benchmark
+
+    Data shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    """
+    adc_data = common.scene(data_shape)
+    window_params = {
+        "axis": -1,
+        "window_type": "hann"
+    }
+    fft_params = {
+        "type": "range-doppler",
+        "normalize": True,
+        "out_format": "modulus"
+    }
+    window_alg = pyrads.algms.window.Window(data_shape, **window_params)
+    fft_alg = pyrads.algms.fft.FFT(data_shape, **fft_params)
+    windowed_fft_alg = pyrads.algms.windowed_fft.WindowedFFT(
+        data_shape,
+        window_type=window_params["window_type"],
+        **fft_params
+    )
+    separate = common.measure(
+        lambda data: fft_alg(window_alg(data)), adc_data, n_repeats=1)
+    fused = common.measure(windowed_fft_alg, adc_data, n_repeats=1)
+    print("Input cube: {:.1f} MiB".format(adc_data.nbytes / 2**20))
+    for name, (run_time, peak_memory, _) in (("Window + FFT", separate),
+                                             ("WindowedFFT", fused)):
+        print("{:>12}: {:.3f} s, peak memory {:.1f} MiB".format(
+            name, run_time, peak_memory / 2**20))
+    print("Outputs match: {}".format(np.allclose(separate[2], fused[2])))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -97,20 +97,19 @@ def main(frame_n=30, multi_frame=True, overlap=True, scene_n="new_1"):
         range_fft_alg,
         oscfar_alg
         ]
-    pipeline = pyrads.pipeline.Pipeline(algorithms)
+    pipeline = pyrads.pipeline.Pipeline(algorithms, retain="lazy")
     pipe_data = pipeline(reduced_data)
-    fft_out = pipe_data[-2]
-    oscfar_out = pipe_data[-1]
 
     # Plot results
     if multi_frame==False:
-        fft_data = fft_out[frame_n, 0, 0, :, :]
-        out_data = oscfar_out[frame_n, 0, 0, :, :]
+        # Only the plotted frame is computed
+        fft_data = pipe_data[-2, frame_n][0, 0, :, :]
+        out_data = pipe_data[-1, frame_n][0, 0, :, :]
         pyrads.utils.plotter.plot_rd_map(
                 image, fft_data, out_data, scene_n=scene_n)
     else:
-        fft_data = fft_out[:, 0, 0, :, :]
-        out_data = oscfar_out[:, 0, 0, :, :]
+        fft_data = pipe_data[-2][:, 0, 0, :, :]
+        out_data = pipe_data[-1][:, 0, 0, :, :]
         if overlap:
             n_plots = 2
         else:
@@ -108,10 +108,11 @@ def main(frame_n=14, chirp_n=30, multi_ramp=True, scene_n=7):
         window_alg,
         range_fft_alg
         ]
-    pipeline = pyrads.pipeline.Pipeline(algorithms)
+    pipeline = pyrads.pipeline.Pipeline(algorithms, retain="lazy")
     pipe_data = pipeline(reduced_data)
-    raw_out = pipe_data[2][frame_n, 0, 0, chirp_n, :]
-    fft_out = pipe_data[-1][frame_n, 0, 0, chirp_n, :]
+    # Only the plotted frame is computed
+    raw_out = pipe_data[2, frame_n][0, 0, chirp_n, :]
+    fft_out = pipe_data[-1, frame_n][0, 0, chirp_n, :]
 
     # Plot results
     plotter(raw_out, fft_out, image)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Cell-averaging CFAR algorithms
+
+The training-cell sums are computed from cumulative sums (1D) or integral
+images (2D), so the cost per cell does not depend on the window size.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import pyrads.algms.cfar
+
+
+class CACFAR(pyrads.algms.cfar.CFAR):
+    """
+    Cell-averaging CFAR detector
+
+    The threshold is the mean of all the training cells of the window.
+    """
+    NAME = "CA-CFAR"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+    def noise_level(self, lead, lag, train):
+        """
+        Estimate the noise level from the (sum, n_cells) of the training
+        cells before the CUT, after the CUT and of the whole window
+        """
+        return train[0] / train[1]
+
+
+    def run_1d(self, data):
+        """
+        Run the CFAR in 1D
+        """
+        # Compute object detection
+        result = self.detections(data, self.threshold_1d(data))
+        return result
+
+
+    def threshold_1d(self, data):
+        """
+        Compute the 1D threshold from the cumulative sums of the data
+        """
+        self.check_window()
+        padded_data = self.padding(data)
+        half = self.window_width // 2
+        width = self.n_guard_cells + self.window_width + 1
+        n_samples = data.shape[-1]
+        # Cumulative sum with a leading zero, so that the sum of
+        # padded_data[..., i:j] is cum_sum[..., j] - cum_sum[..., i].
+        # It is kept in double precision for any dtype, as differences of
+        # large sums lose too many digits in single precision
+        cum_sum = np.zeros(padded_data.shape[:-1] + (padded_data.shape[-1]+1,))
+        np.cumsum(padded_data, axis=-1, out=cum_sum[..., 1:])
+        lead_sum = cum_sum[..., half:half+n_samples] - cum_sum[..., :n_samples]
+        lag_sum = (cum_sum[..., width:width+n_samples]
+                   - cum_sum[..., width-half:width-half+n_samples])
+        threshold = self.noise_level(
+            (lead_sum, half),
+            (lag_sum, half),
+            (lead_sum + lag_sum, 2*half)
+        )
+        return threshold
+
+
+    @staticmethod
+    def box_sum(integral, out_shape, init_i, end_i, init_j, end_j):
+        """
+        Sum of window[init_i:end_i, init_j:end_j] for every cell, taken
+        from the integral image of the padded data
+        """
+        n_i, n_j = out_shape
+        return (integral[..., end_i:end_i+n_i, end_j:end_j+n_j]
+                - integral[..., init_i:init_i+n_i, end_j:end_j+n_j]
+                - integral[..., end_i:end_i+n_i, init_j:init_j+n_j]
+                + integral[..., init_i:init_i+n_i, init_j:init_j+n_j])
+
+
+    def run_2d(self, data):
+        """
+        Run the CFAR in 2D
+        """
+        # Compute object detection
+        result = self.detections(data, self.threshold_2d(data))
+        return result
+
+
+    def threshold_2d(self, data):
+        """
+        Compute the 2D threshold from the integral image of the data
+
+        The leading and lagging training cells are the ones before and
+        after the CUT along the range axis. Training cells on the same
+        range bin as the CUT only contribute to the whole-window average.
+        """
+        self.check_window()
+        padded_data = self.padding(data)
+        half_width = (self.n_guard_cells + self.window_width) // 2
+        width = 2*half_width + 1
+        guard_init = self.window_width // 2
+        guard_end = width - self.window_width // 2
+        out_shape = data.shape[-2:]
+        # Integral image with a leading row and column of zeros, in double
+        # precision for any dtype (see run_1d)
+        integral = np.zeros(padded_data.shape[:-2]
+                            + (padded_data.shape[-2]+1, padded_data.shape[-1]+1))
+        np.cumsum(padded_data, axis=-2, out=integral[..., 1:, 1:])
+        np.cumsum(integral[..., 1:, 1:], axis=-1, out=integral[..., 1:, 1:])
+
+        guard_size = guard_end - guard_init
+        box = lambda *limits: self.box_sum(integral, out_shape, *limits)
+        train_sum = (box(0, width, 0, width)
+                     - box(guard_init, guard_end, guard_init, guard_end))
+        lead_sum = (box(0, width, 0, half_width)
+                    - box(guard_init, guard_end, guard_init, half_width))
+        lag_sum = (box(0, width, half_width+1, width)
+                   - box(guard_init, guard_end, half_width+1, guard_end))
+        n_side = width*half_width - guard_size*(half_width-guard_init)
+        threshold = self.noise_level(
+            (lead_sum, n_side),
+            (lag_sum, n_side),
+            (train_sum, width**2 - guard_size**2)
+        )
+        return threshold
+
+
+class GOCFAR(CACFAR):
+    """
+    Greatest-of CFAR detector
+
+    The threshold is the highest of the leading and lagging averages.
+    """
+    NAME = "GO-CFAR"
+
+    def noise_level(self, lead, lag, train):
+        return np.maximum(lead[0] / lead[1], lag[0] / lag[1])
+
+
+class SOCFAR(CACFAR):
+    """
+    Smallest-of CFAR detector
+
+    The threshold is the lowest of the leading and lagging averages.
+    """
+    NAME = "SO-CFAR"
+
+    def noise_level(self, lead, lag, train):
+        return np.minimum(lead[0] / lead[1], lag[0] / lag[1])
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Base class for CFAR detectors
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import pyrads.algorithm
+import pyrads.detections
+
+
+class CFAR(pyrads.algorithm.Algorithm):
+    """
+    Parent class for CFAR detectors
+
+    Holds the window geometry and the padding shared by all CFAR variants.
+    Children implement run_1d and run_2d, and threshold_1d and threshold_2d
+    for the threshold sweeps.
+
+    The vectorized engines need a window symmetric around the CUT, so in
+    1D window_width + n_guard_cells must be even. Only the OS-CFAR
+    'reference' engine, also used by its 'auto' engine, handles odd sums.
+
+    Supported output formats:
+        'dense': boolean array with the shape of the input (default)
+        'sparse': pyrads.detections.Detections with the coordinates,
+            power and threshold margin of the detected cells
+    """
+    OUT_FORMATS = ("dense", "sparse")
+    SWEEP_FORMATS = ("dense", "counts")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Load cfar parameters
+        self.n_dims = kwargs.get("n_dims")
+        self.window_width = kwargs.get("window_width")
+        self.alpha = kwargs.get("alpha")
+        self.n_guard_cells = kwargs.get("n_guard_cells")
+        self.out_format = kwargs.get("out_format", "dense")
+        if self.out_format not in self.OUT_FORMATS:
+            raise ValueError("Invalid format: {}".format(self.out_format))
+
+
+    @property
+    def n_signal_dims(self):
+        return self.n_dims
+
+
+    def calculate_out_shape(self):
+        """
+        CFAR algorithms do not alter the data dimensionality
+        """
+        self.out_data_shape = self.in_data_shape
+
+
+    def padding(self, data):
+        """
+        Pad the input data with zeros along the sample dimension
+
+        It is assumed that the sample dimension is the last dimension of
+        the input data.
+
+        The size of the padding is dependent on the CFAR window size
+        and the number of guard cells.
+        """
+        pad_size = (self.n_guard_cells+self.window_width) // 2
+        if self.n_dims==1:
+            pad_shape = (data.shape[-1]+2*pad_size, )
+            padded_data_shape =  data.shape[:-1] + pad_shape
+            padded_data = self.scratch(
+                "padded", padded_data_shape, self.real_dtype())
+            data_mean = data.mean()
+            padded_data[..., :pad_size] = data_mean
+            padded_data[..., -pad_size:] = data_mean
+            padded_data[..., pad_size:-pad_size] = data
+        if self.n_dims==2:
+            pad_shape = (data.shape[-2]+2*pad_size, data.shape[-1]+2*pad_size)
+            # Final shape is same as input shape
+            # with the last two dimensions modified with the padding
+            padded_data_shape =  data.shape[:-2] + pad_shape
+            padded_data = self.scratch(
+                "padded", padded_data_shape, self.real_dtype())
+            padded_data[..., :, :pad_size] = 0
+            padded_data[..., :, -pad_size:] = 0
+            padded_data[..., pad_size:-pad_size, pad_size:-pad_size] = data
+            # Pad Doppler dimension with opposite side values,
+            # as Doppler FFT has toroid-like output
+            padded_data[..., :pad_size, pad_size:-pad_size] = data[..., :-pad_size-1:-1, :]
+            padded_data[..., -pad_size:, pad_size:-pad_size] = data[..., pad_size-1::-1, :]
+        return padded_data
+
+
+    def training_mask_1d(self):
+        """
+        Boolean mask of the training cells within a 1D CFAR window
+        """
+        width = self.n_guard_cells + self.window_width + 1
+        mask = np.zeros(width, dtype=bool)
+        mask[:self.window_width//2] = True
+        mask[width-self.window_width//2:] = True
+        return mask
+
+
+    def training_mask_2d(self):
+        """
+        Boolean mask of the training cells within a 2D CFAR window
+
+        The guard area is a square centered on the cell under test, with
+        the same relative position for every window.
+        """
+        half_width = (self.n_guard_cells + self.window_width) // 2
+        width = 2*half_width + 1
+        mask = np.ones((width, width), dtype=bool)
+        guard = slice(self.window_width//2, width-self.window_width//2)
+        mask[guard, guard] = False
+        return mask
+
+
+    def detections(self, data, threshold):
+        """
+        Compare the data with the threshold and format the detections
+        """
+        # Keep the type of data*alpha, which depends on the type of alpha
+        dtype = (data.flat[:1] * self.alpha).dtype
+        scaled = np.multiply(
+            data, self.alpha, out=self.scratch("scaled", data.shape, dtype))
+        if self.out_format == "dense":
+            mask = np.greater(
+                scaled, threshold, out=self.out_buffer(data.shape, bool))
+            return mask
+        mask = scaled > threshold
+        # Keep the values of the detected cells only
+        flat_index = np.flatnonzero(mask)
+        power = data.reshape(-1)[flat_index]
+        margin = power*self.alpha - threshold.reshape(-1)[flat_index]
+        result = pyrads.detections.Detections.from_flat_index(
+            flat_index, mask.shape, power, margin)
+        return result
+
+
+    def threshold(self, data):
+        """
+        Compute the threshold of every cell, before scaling by alpha
+        """
+        if self.n_dims == 1:
+            threshold = self.threshold_1d(data)
+        elif self.n_dims == 2:
+            threshold = self.threshold_2d(data)
+        return threshold
+
+
+    def sweep_input(self, in_data):
+        """
+        Check and convert the input of a sweep, as done by __call__
+        """
+        if not self.accepts(in_data.shape):
+            raise ValueError(
+                "Input shape {} does not match with algorithm input shape {}"
+                "".format(in_data.shape, self.in_data_shape))
+        return self.cast(in_data)
+
+
+    def sweep_detections(self, data, thresholds, alphas, out_format):
+        """
+        Compare the data with a stack of thresholds for every alpha
+
+        @thresholds: Array of shape (n_thresholds,) + data.shape
+
+        Return a boolean array of shape (n_thresholds, n_alphas) +
+        data.shape for the 'dense' format, or the number of detections
+        with shape (n_thresholds, n_alphas) for the 'counts' format.
+        """
+        if out_format not in self.SWEEP_FORMATS:
+            raise ValueError("Invalid format: {}".format(out_format))
+        settings_shape = (len(thresholds), len(alphas))
+        if out_format == "dense":
+            result = np.empty(settings_shape + data.shape, dtype=bool)
+        else:
+            result = np.zeros(settings_shape, dtype=np.intp)
+        for j, alpha in enumerate(alphas):
+            # Same products as detections, which keeps the type of alpha
+            dtype = (data.flat[:1] * alpha).dtype
+            scaled = np.multiply(
+                data, alpha, out=self.scratch("scaled", data.shape, dtype))
+            for i, threshold in enumerate(thresholds):
+                if out_format == "dense":
+                    np.greater(scaled, threshold, out=result[i, j])
+                else:
+                    mask = np.greater(scaled, threshold,
+                                      out=self.scratch("mask", data.shape, bool))
+                    result[i, j] = np.count_nonzero(mask)
+        return result
+
+
+    def sweep(self, in_data, alphas, out_format="dense"):
+        """
+        Run the detector for every value in a sequence of alphas
+
+        The threshold does not depend on alpha, so it is computed once and
+        every alpha only costs a comparison. The detections are the same
+        as setting alpha and calling the detector.
+
+        @out_format: 'dense' for a boolean array of shape
+            (n_alphas,) + input shape, 'counts' for the number of
+            detections per alpha
+        """
+        data = self.sweep_input(in_data)
+        thresholds = self.threshold(data)[np.newaxis]
+        return self.sweep_detections(data, thresholds, alphas, out_format)[0]
+
+
+    def symmetric_window(self):
+        """
+        Return True if the window is symmetric around the CUT
+
+        2D windows always are. 1D windows need an even window_width +
+        n_guard_cells, otherwise they have one more cell after the CUT.
+        """
+        return self.n_dims == 2 or (self.n_guard_cells + self.window_width) % 2 == 0
+
+
+    def check_window(self):
+        """
+        Vectorized CFAR engines require a window symmetric around the CUT
+        """
+        if not self.symmetric_window():
+            raise ValueError(
+                "window_width + n_guard_cells must be even for the 1D {}"
+                "".format(type(self).__name__))
+
+
+    def _run(self, in_data):
+        if self.n_dims== 1:
+            result = self.run_1d(in_data)
+        elif self.n_dims==2:
+            result = self.run_2d(in_data)
+        return result
@@ -1,18 +1,156 @@
 #!/usr/bin/env python3
 """
-Identity algorithm. Used mostly for debugging
+DBSCAN clustering algorithm
+
+Detections along a single axis are clustered from the gaps between their
+sorted indices. For two or more dimensions, neighbours are found with a
+uniform grid of cells of size epsilon, so that only points in adjacent
+cells are compared.
 """
 # Standard libraries
+import itertools
 import numpy as np
 # Local libraries
 import pyrads.algorithm
+import pyrads.detections
+
+
+def grid_neighbours(points, epsilon, groups=None):
+    """
+    Find all pairs of points closer than epsilon
+
+    Points are hashed into a uniform grid of cells of size epsilon, so
+    that neighbours can only be in the same or in adjacent cells. Points
+    with different groups are never neighbours.
+
+    @points: Array of shape (n_points, n_dims) with the coordinates
+    @groups: Optional array of shape (n_points,) with non-negative ints
+
+    Return the indices and distances of the neighbour pairs. Every pair
+    is given in both directions, and points are not paired with
+    themselves.
+    """
+    n_points, n_dims = points.shape
+    if groups is None:
+        groups = np.zeros(n_points, dtype=np.intp)
+    if n_points == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0)
+    cells = np.floor(points / epsilon).astype(np.intp)
+    # Shift the cells so that neighbouring cells never overflow into
+    # the next row of the grid
+    cells -= cells.min(axis=0) - 1
+    grid_size = cells.max(axis=0) + 2
+    strides = np.cumprod(np.r_[1, grid_size[::-1]])[::-1]
+    key = groups*strides[0] + cells @ strides[1:]
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    point_index = np.arange(n_points)
+    pairs_i = []
+    pairs_j = []
+    for offset in itertools.product((-1, 0, 1), repeat=n_dims):
+        target = key + np.dot(offset, strides[1:])
+        start = np.searchsorted(sorted_key, target, "left")
+        count = np.searchsorted(sorted_key, target, "right") - start
+        # Expand every point into its candidates in the target cell
+        candidate_i = np.repeat(point_index, count)
+        first = np.cumsum(count) - count
+        candidate_pos = np.arange(candidate_i.size) - np.repeat(first - start, count)
+        pairs_i.append(candidate_i)
+        pairs_j.append(order[candidate_pos])
+    pairs_i = np.concatenate(pairs_i)
+    pairs_j = np.concatenate(pairs_j)
+    distance = np.sqrt(((points[pairs_i] - points[pairs_j])**2).sum(axis=-1))
+    valid = (distance < epsilon) & (pairs_i != pairs_j)
+    return pairs_i[valid], pairs_j[valid], distance[valid]
+
+
+def connected_components(n_nodes, edges_i, edges_j):
+    """
+    Label the connected components of a graph
+
+    Every node points to a root, and roots are hooked to the lowest root
+    of their edges until all edges join nodes with the same root.
+    Return the root of every node, which is the lowest node of its
+    component.
+    """
+    roots = np.arange(n_nodes)
+    while True:
+        root_i = roots[edges_i]
+        root_j = roots[edges_j]
+        if np.array_equal(root_i, root_j):
+            return roots
+        lowest = np.minimum(root_i, root_j)
+        np.minimum.at(roots, root_i, lowest)
+        np.minimum.at(roots, root_j, lowest)
+        # Compress the paths, so that every node points to its root
+        while True:
+            next_roots = roots[roots]
+            if np.array_equal(next_roots, roots):
+                break
+            roots = next_roots
+
+
+def dbscan_points(points, epsilon, min_pts, groups=None):
+    """
+    DBSCAN over a set of points in any number of dimensions
+
+    Points are core points if they have at least min_pts neighbours
+    closer than epsilon, not counting themselves. Border points are
+    assigned to the cluster of their nearest core neighbour. Points can
+    be, e.g., (doppler, range) bins or scaled physical (x, y, v)
+    coordinates.
+
+    Return the cluster of every point, numbered from 0 in order of the
+    first point of each cluster, or -1 for noise.
+    """
+    n_points = points.shape[0]
+    pairs_i, pairs_j, distance = grid_neighbours(points, epsilon, groups)
+    is_core = np.bincount(pairs_i, minlength=n_points) >= min_pts
+    # Join core points that are neighbours
+    core_edges = is_core[pairs_i] & is_core[pairs_j]
+    roots = connected_components(
+        n_points, pairs_i[core_edges], pairs_j[core_edges])
+    cluster_root = np.where(is_core, roots, -1)
+    # Assign border points to the nearest core point
+    border_edges = ~is_core[pairs_i] & is_core[pairs_j]
+    border_i = pairs_i[border_edges]
+    border_j = pairs_j[border_edges]
+    nearest = np.lexsort((border_j, distance[border_edges], border_i))
+    border_i = border_i[nearest]
+    first = np.diff(border_i, prepend=-1) != 0
+    cluster_root[border_i[first]] = roots[border_j[nearest][first]]
+    # Number the clusters in order of appearance
+    clusters = np.full(n_points, -1)
+    members = cluster_root >= 0
+    _, first_member, cluster_id = np.unique(
+        cluster_root[members], return_index=True, return_inverse=True)
+    rank = np.empty(first_member.size, dtype=np.intp)
+    rank[np.argsort(first_member)] = np.arange(first_member.size)
+    clusters[members] = rank[cluster_id.reshape(-1)]
+    return clusters
 
 
 class DBSCAN(pyrads.algorithm.Algorithm):
     """
-    Parent class for radar algorithms
+    DBSCAN clustering of detections
+
+    Detections are clustered over the last n_dims axes, and independently
+    for every index of the leading axes (e.g. every ramp in 1D or every
+    range-Doppler map in 2D).
+
+    After every call, the clusters attribute holds one entry per cluster:
+        'index': indices of the leading axes
+        'label': label of the cluster within its leading index
+        'size': number of points in the cluster
+        'centroid': mean bin of the cluster points
+        'extent': number of bins between the first and last point
+        'peak_power': highest power of the cluster points
+    For n_dims > 1, centroid and extent have one row per clustered axis.
     """
     NAME = "DBSCAN"
+    STATE_ATTRIBUTES = pyrads.algorithm.Algorithm.STATE_ATTRIBUTES + (
+        "n_clusters", "clusters")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -22,6 +160,12 @@ class DBSCAN(pyrads.algorithm.Algorithm):
         self.epsilon = kwargs.get("epsilon")
         # dbscan variables
         self.n_clusters = 0
+        self.clusters = {}
+
+
+    @property
+    def n_signal_dims(self):
+        return self.n_dims
 
 
     def calculate_out_shape(self):
@@ -30,46 +174,163 @@ class DBSCAN(pyrads.algorithm.Algorithm):
         """
         self.out_data_shape = self.in_data_shape
 
+
+    def get_detections(self, in_data):
+        """
+        Return the flat indices and the power of the detected cells
+
+        The indices are sorted in C order. Dense inputs are considered
+        detected wherever they are non-zero.
+        """
+        if isinstance(in_data, pyrads.detections.Detections):
+            flat_index = np.ravel_multi_index(in_data.coords, in_data.shape)
+            power = in_data.power.astype(float)
+        else:
+            flat_index = np.flatnonzero(in_data)
+            power = in_data.reshape(-1)[flat_index].astype(float)
+        return flat_index, power
+
+
+    @staticmethod
+    def summarize_1d(bins, power, cluster_start):
+        """
+        Compute the summary arrays of the clusters
+
+        The points are sorted by cluster, and cluster_start holds the
+        index of the first point of every cluster.
+        """
+        size = np.diff(np.r_[cluster_start, bins.size])
+        if not size.size:
+            return {key: np.zeros(0) for key in
+                    ("size", "centroid", "extent", "peak_power")}
+        summary = {
+            "size": size,
+            "centroid": np.add.reduceat(bins, cluster_start) / size,
+            "extent": bins[cluster_start+size-1] - bins[cluster_start] + 1,
+            "peak_power": np.maximum.reduceat(power, cluster_start),
+        }
+        return summary
+
+
     def _run_1d(self, in_data):
-        detections = np.where(in_data)[0]
-        neighbours = np.zeros_like(detections)
-        core_points = np.zeros_like(detections)
-        labelled_data = np.zeros_like(in_data) - 1
-        # Iterate over all points to count how many neighbours they have
-        for i, ego_point in enumerate(detections):
-            neighbour_coords = []
-            # Iterate over all points right of the ego_point.
-            # Neighbours to its left were already counted on previous iterations
-            for j, point in enumerate(detections[i+1:]):
-                if np.abs(point - ego_point) < self.epsilon:
-                    neighbours[i] += 1
-                    neighbours[i+j+1] += 1
-                    neighbour_coords.append(point)
-                # If point is further than epsilon, no more points can be
-                # found closer than epsilon
-                else:
-                    break
-            # Determine if ego point is a core points,
-            # based on the number of neighbours it has
-            core_points[i] = neighbours[i] >= self.min_pts
-            # create labelled clusters
-            if core_points[i]:
-                # Check if point was labelled before
-                if labelled_data[ego_point] == -1:
-                    self.n_clusters += 1
-                    labelled_data[ego_point] = self.n_clusters
-                for point in neighbour_coords:
-                    labelled_data[point] = labelled_data[ego_point]
-            else:
-                # Noise is labelled as zero
-                labelled_data[ego_point] = 0
+        """
+        Cluster the detections along the last axis, for every ramp at once
+
+        All detections are placed on a single sorted axis, with the ramps
+        separated by more than epsilon, so that neighbours and clusters
+        are found from the gaps between sorted indices. Border points are
+        assigned to the cluster of the nearest core point.
+
+        Labels are -1 for cells without detection, 0 for noise and start
+        from 1 in every ramp.
+        """
+        n_bins = in_data.shape[-1]
+        flat_index, power = self.get_detections(in_data)
+        ramps, bins = np.divmod(flat_index, n_bins)
+        # Position of the detections on a single axis
+        ramp_gap = n_bins + int(np.ceil(self.epsilon)) + 1
+        position = ramps*ramp_gap + bins
+        # Count neighbours closer than epsilon, excluding the point itself
+        n_neighbours = (np.searchsorted(position, position+self.epsilon, "left")
+                        - np.searchsorted(position, position-self.epsilon, "right")
+                        - 1)
+        core_position = position[n_neighbours >= self.min_pts]
+        # A new cluster starts wherever two core points are not neighbours
+        new_cluster = np.diff(core_position, prepend=-np.inf) >= self.epsilon
+        core_cluster = np.cumsum(new_cluster) - 1
+        # Assign every point to the cluster of its nearest core point
+        cluster_id = np.full(position.shape, -1)
+        if core_position.size:
+            right = np.searchsorted(core_position, position, "right")
+            left = np.maximum(right - 1, 0)
+            right = np.minimum(right, core_position.size - 1)
+            left_distance = np.abs(position - core_position[left])
+            right_distance = np.abs(core_position[right] - position)
+            nearest = np.where(left_distance <= right_distance, left, right)
+            distance = np.minimum(left_distance, right_distance)
+            in_cluster = distance < self.epsilon
+            cluster_id[in_cluster] = core_cluster[nearest[in_cluster]]
+        # Number the clusters from 1 within each ramp
+        n_clusters = int(core_cluster[-1]) + 1 if core_cluster.size else 0
+        members = cluster_id >= 0
+        cluster_start = np.flatnonzero(np.diff(cluster_id[members], prepend=-1))
+        cluster_ramp = ramps[members][cluster_start]
+        cluster_label = (np.arange(n_clusters)
+                         - np.searchsorted(cluster_ramp, cluster_ramp) + 1)
+        point_labels = np.zeros(position.shape, dtype=np.int32)
+        point_labels[members] = cluster_label[cluster_id[members]]
+        labelled_data = np.full(in_data.shape, -1, dtype=np.int32)
+        labelled_data.reshape(-1)[flat_index] = point_labels
+        self.n_clusters = n_clusters
+        self.clusters = self.summarize_1d(
+            bins[members], power[members], cluster_start)
+        ramp_index = np.unravel_index(cluster_ramp, in_data.shape[:-1] or (1,))
+        self.clusters["index"] = np.array(ramp_index)[:len(in_data.shape)-1]
+        self.clusters["label"] = cluster_label
         return labelled_data
 
+
+    def _run_nd(self, in_data):
+        """
+        Cluster the detections over the last n_dims axes
+
+        Labels are -1 for cells without detection, 0 for noise and start
+        from 1 for every index of the leading axes.
+        """
+        flat_index, power = self.get_detections(in_data)
+        map_size = int(np.prod(in_data.shape[-self.n_dims:]))
+        groups, map_index = np.divmod(flat_index, map_size)
+        bins = np.array(np.unravel_index(map_index, in_data.shape[-self.n_dims:]))
+        bins = bins.reshape(self.n_dims, -1)
+        cluster_id = dbscan_points(bins.T, self.epsilon, self.min_pts, groups)
+        members = cluster_id >= 0
+        # Clusters are numbered by their first point, so they are sorted
+        # by leading index
+        n_clusters = int(cluster_id.max()) + 1 if members.any() else 0
+        _, first_member = np.unique(cluster_id[members], return_index=True)
+        cluster_map = groups[members][first_member]
+        cluster_label = (np.arange(n_clusters)
+                         - np.searchsorted(cluster_map, cluster_map) + 1)
+        point_labels = np.zeros(flat_index.shape, dtype=np.int32)
+        point_labels[members] = cluster_label[cluster_id[members]]
+        labelled_data = np.full(in_data.shape, -1, dtype=np.int32)
+        labelled_data.reshape(-1)[flat_index] = point_labels
+        # Summary of the clusters
+        member_id = cluster_id[members]
+        member_bins = bins[:, members]
+        size = np.bincount(member_id, minlength=n_clusters)
+        lowest = np.full((self.n_dims, n_clusters), np.iinfo(np.intp).max)
+        highest = np.full((self.n_dims, n_clusters), -1)
+        for axis in range(self.n_dims):
+            np.minimum.at(lowest[axis], member_id, member_bins[axis])
+            np.maximum.at(highest[axis], member_id, member_bins[axis])
+        peak_power = np.full(n_clusters, -np.inf)
+        np.maximum.at(peak_power, member_id, power[members])
+        map_shape = in_data.shape[:-self.n_dims] or (1,)
+        self.n_clusters = n_clusters
+        self.clusters = {
+            "index": np.array(np.unravel_index(cluster_map, map_shape))[
+                :len(in_data.shape)-self.n_dims],
+            "label": cluster_label,
+            "size": size,
+            "centroid": np.array([np.bincount(member_id, weights=axis_bins,
+                                              minlength=n_clusters)
+                                  for axis_bins in member_bins]) / size,
+            "extent": highest - lowest + 1,
+            "peak_power": peak_power,
+        }
+        return labelled_data
+
+
     def _run(self, in_data):
         """
-        Return input data
+        Return the labelled detections
         """
         if self.n_dims == 1:
             labels = self._run_1d(in_data)
+        elif self.n_dims > 1:
+            labels = self._run_nd(in_data)
+        else:
+            raise ValueError("Invalid number of dimensions: {}".format(self.n_dims))
         result = labels
         return result
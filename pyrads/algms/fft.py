@@ -30,6 +30,21 @@ class FFT(pyrads.algorithm.Algorithm):
         self.off_bins = kwargs.get("off_bins", 0)
         self.n_real_bins = 0
         super().__init__(*args, **kwargs)
+        # The input shape is fixed, so the slices and norms are cached here
+        self.n_real_bins = (self.in_data_shape[-1] // 2) - self.off_bins
+        self.range_bins = slice(self.off_bins, self.off_bins+self.n_real_bins)
+        self.range_norm = self.in_data_shape[-1]*2 if self.normalize else 1
+        if self.type in ("doppler", "range-doppler"):
+            self.doppler_norm = self.in_data_shape[-2]*2 if self.normalize else 1
+            self.doppler_shift = self.in_data_shape[-2] // 2
+
+
+    @property
+    def n_signal_dims(self):
+        """
+        The range FFT works on samples, the others on ramps and samples
+        """
+        return 1 if self.type == "range" else 2
 
 
     def calculate_out_shape(self):
@@ -54,7 +69,8 @@ class FFT(pyrads.algorithm.Algorithm):
         Adjust the output FFT data to the specified format
         """
         if self.out_format == "modulus":
-            formatted_fft = np.abs(fft_data)
+            out = self.out_buffer(fft_data.shape, fft_data.real.dtype)
+            formatted_fft = np.abs(fft_data, out=out)
             # Arrange data between 0 and 1
             if self.unitary:
                 formatted_fft = formatted_fft - formatted_fft.min()
@@ -79,31 +95,45 @@ class FFT(pyrads.algorithm.Algorithm):
         return result
 
 
-    def range_fft(self, data):
+    def range_fft(self, data, norm=None):
         """
         Apply FFT on last axis.
+
+        Real samples use the real-input FFT, which only computes the
+        positive spectrum. The normalization is applied to the kept bins.
         """
+        if norm is None:
+            norm = self.range_norm
         # Apply Range FFT only positive frequencies
-        data = np.fft.fft(data, axis=-1)
-        # Normalize the FFT
-        if self.normalize:
-            data /= self.in_data_shape[-1]*2
-        # Remove negative spectrum
-        real_data = data[...,  self.off_bins : self.off_bins+self.n_real_bins]
+        if np.iscomplexobj(data):
+            data = np.fft.fft(data, axis=-1)
+        else:
+            data = np.fft.rfft(data, axis=-1)
+        # Remove negative spectrum and normalize the FFT
+        real_data = data[..., self.range_bins]
+        if norm != 1:
+            real_data = real_data / norm
         return real_data
 
 
-    def doppler_fft(self, data):
+    def doppler_fft(self, data, norm=None):
         """
         Apply the FFT to last two axis and generate range-Doppler map
+
+        The FFT shift and the normalization are done in a single pass.
         """
+        if norm is None:
+            norm = self.doppler_norm
         # Apply Doppler FFT
         data = np.fft.fft(data, axis=-2)
-        data = np.fft.fftshift(data, axes=-2)
-        # Normalize the FFT
-        if self.normalize:
-            data /= self.in_data_shape[-2]*2
-        return data
+        shift = self.doppler_shift
+        n_chirps = data.shape[-2]
+        result = np.empty_like(data)
+        np.divide(data[..., :n_chirps-shift, :], norm,
+                  out=result[..., shift:, :])
+        np.divide(data[..., n_chirps-shift:, :], norm,
+                  out=result[..., :shift, :])
+        return result
 
 
     def _run(self, in_data):
@@ -115,7 +145,9 @@ class FFT(pyrads.algorithm.Algorithm):
         elif self.type=="doppler":
             fft_result = self.doppler_fft(in_data)
         elif self.type=="range-doppler":
-            fft_range = self.range_fft(in_data)
-            fft_result = self.doppler_fft(fft_range)
-        formatted_result = self.format_fft(fft_result)
-        return formatted_result
+            # Both normalizations are applied at once after the Doppler FFT.
+            # The range spectrum is not kept, so it is freed once consumed
+            fft_result = self.doppler_fft(
+                self.range_fft(in_data, norm=1),
+                norm=self.range_norm*self.doppler_norm)
+        return self.format_fft(fft_result)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Fused algorithm
+
+Runs a chain of fusible algorithms block by block, so the whole cube is
+read and written once instead of once per algorithm. Created by
+Pipeline.compile.
+"""
+# Standard libraries
+import copy
+import numpy as np
+# Local libraries
+import pyrads.algorithm
+
+
+# Input bytes per block, small enough for the block and its temporaries
+# to stay in cache. See benchmarks/pipeline_fusion.py
+BLOCK_BYTES = 2**19
+
+
+class Fused(pyrads.algorithm.Algorithm):
+    """
+    Chain of fusible algorithms applied in a single pass
+
+    The batch entries of the input are processed in blocks of about
+    BLOCK_BYTES. Every algorithm of the chain runs on the block while it
+    is in cache, and only the last result is written to the output.
+    Algorithms with FUSIBLE set only look at the signal axes of each
+    entry, so the result is the same as running them on the whole cube.
+
+    The output buffer is reused between calls if the last algorithm of
+    the chain has reuse_buffers set.
+    """
+    def __init__(self, algorithms, **kwargs):
+        self.algorithms = list(algorithms)
+        # The name lists the fused algorithms, e.g. 'RemoveOffset+Window'
+        self.NAME = "+".join(alg.NAME for alg in self.algorithms)
+        super().__init__(self.algorithms[0].in_data_shape, **kwargs)
+
+
+    def block_algorithms(self):
+        """
+        Return copies of the algorithms that run on the blocks
+
+        The copies are made on every run, so they follow the current
+        parameters of the algorithms. All but the first algorithm
+        overwrite the block of the previous one, which is never seen
+        outside the chain, and the hooks are not called per block.
+        """
+        block_algorithms = []
+        for alg in self.algorithms:
+            block_alg = copy.copy(alg)
+            block_alg.in_place = alg.in_place or len(block_algorithms) > 0
+            block_alg.reuse_buffers = False
+            block_alg._buffers = {}
+            block_alg.pre_hooks = []
+            block_alg.post_hooks = []
+            block_algorithms.append(block_alg)
+        return block_algorithms
+
+
+    @property
+    def n_signal_dims(self):
+        return max(alg.n_signal_dims for alg in self.algorithms)
+
+
+    def calculate_out_shape(self):
+        """
+        Fusible algorithms do not alter the data dimensionality
+        """
+        self.out_data_shape = self.algorithms[-1].out_data_shape
+
+
+    def run_chain(self, data, block_algorithms):
+        """
+        Run all the algorithms of the chain
+        """
+        for alg in block_algorithms:
+            data = alg(data)
+        return data
+
+
+    def _run(self, in_data):
+        """
+        Run the chain over blocks of batch entries
+        """
+        n_batch_dims = in_data.ndim - self.n_signal_dims
+        entries = in_data.reshape((-1,) + in_data.shape[n_batch_dims:])
+        entry_bytes = max(1, entries[:1].nbytes)
+        block_size = max(1, BLOCK_BYTES // entry_bytes)
+        # The output is kept between calls if the last algorithm keeps its own
+        self.reuse_buffers = self.algorithms[-1].reuse_buffers
+        block_algorithms = self.block_algorithms()
+        result = None
+        for start in range(0, entries.shape[0], block_size):
+            block = self.run_chain(entries[start:start+block_size],
+                                   block_algorithms)
+            if result is None:
+                out_shape = entries.shape[:1] + block.shape[1:]
+                result = self.out_buffer(out_shape, block.dtype)
+                if result is None:
+                    result = np.empty(out_shape, dtype=block.dtype)
+            result[start:start+block_size] = block
+        return result.reshape(self.out_shape(in_data.shape))
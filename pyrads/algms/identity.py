@@ -19,6 +19,11 @@ class Identity(pyrads.algorithm.Algorithm):
         # Load os-cfar parameters
 
 
+    @property
+    def n_signal_dims(self):
+        return 0
+
+
     def calculate_out_shape(self):
         """
         Do not alter the data dimensionality
@@ -5,60 +5,45 @@ OS-CFAR algorithm
 # Standard libraries
 import numpy as np
 # Local libraries
-import pyrads.algorithm
+import pyrads.algms.cfar
 
 
-class OSCFAR(pyrads.algorithm.Algorithm):
+# Maximum number of training cells gathered at once by the vectorized engine
+CHUNK_ELEMENTS = 2**20
+# Thresholds for the automatic engine selection.
+# See benchmarks/oscfar_engines.py
+MIN_SLIDING_TRAIN = 160
+MIN_HISTOGRAM_TRAIN = 112
+MAX_HISTOGRAM_LEVELS = 2**12
+
+
+class OSCFAR(pyrads.algms.cfar.CFAR):
     """
-    Parent class for radar algorithms
+    Ordered-statistics CFAR detector
+
+    Supported engines:
+        'auto': choose one of the engines below from the window size,
+            ordered_k and the data type (default). 1D windows with an odd
+            window_width + n_guard_cells use the 'reference' engine, as
+            the other engines need a window symmetric around the CUT
+        'vectorized': all windows are built at once as a strided view and
+            the k-th value is picked with a partial selection
+        'sliding': the window slides along the range axis, updating the
+            counts of the ranks leaving and entering it
+        'histogram': like 'sliding', but counting the values directly.
+            Meant for quantized data with few distinct values
+        'reference': original per-cell loop, kept for validation
     """
     NAME = "OS-CFAR"
+    ENGINES = ("auto", "vectorized", "sliding", "histogram", "reference")
 
     def __init__(self,*args,  **kwargs):
         super().__init__(*args, **kwargs)
         # Load os-cfar parameters
-        self.n_dims = kwargs.get("n_dims")
-        self.window_width = kwargs.get("window_width")
         self.ordered_k = kwargs.get("ordered_k")
-        self.alpha = kwargs.get("alpha")
-        self.n_guard_cells = kwargs.get("n_guard_cells")
-
-
-    def calculate_out_shape(self):
-        """
-        CFAR algorithms do not alter the data dimensionality
-        """
-        self.out_data_shape = self.in_data_shape
-
-
-    def padding(self, data):
-        """
-        Pad the input data with zeros along the sample dimension
-
-        It is assumed that the sample dimension is the last dimension of
-        the input data.
-
-        The size of the padding is dependent on the CFAR window size
-        and the number of guard cells.
-        """
-        pad_size = (self.n_guard_cells+self.window_width) // 2
-        if self.n_dims==1:
-            pad_shape = (data.shape[-1]+2*pad_size, )
-            padded_data_shape =  data.shape[:-1] + pad_shape
-            padded_data = np.zeros(padded_data_shape) + data.mean()
-            padded_data[..., pad_size:-pad_size] = data
-        if self.n_dims==2:
-            pad_shape = (data.shape[-2]+2*pad_size, data.shape[-1]+2*pad_size)
-            # Final shape is same as input shape
-            # with the last two dimensions modified with the padding
-            padded_data_shape =  data.shape[:-2] + pad_shape
-            padded_data = np.zeros(padded_data_shape)
-            padded_data[..., pad_size:-pad_size, pad_size:-pad_size] = data
-            # Pad Doppler dimension with opposite side values,
-            # as Doppler FFT has toroid-like output
-            padded_data[..., :pad_size, pad_size:-pad_size] = data[..., :-pad_size-1:-1, :]
-            padded_data[..., -pad_size:, pad_size:-pad_size] = data[..., pad_size-1::-1, :]
-        return padded_data
+        self.engine = kwargs.get("engine", "auto")
+        if self.engine not in self.ENGINES:
+            raise ValueError("{} not a valid OS-CFAR engine".format(self.engine))
 
 
     def get_window_1d(self, data, index_i):
@@ -77,35 +62,376 @@ class OSCFAR(pyrads.algorithm.Algorithm):
 
 
     def get_window_2d(self, data, index_i, index_j=0):
+        """
+        Fetch the training cells of the 2D CFAR window for the specified index
+
+        The guard area and the cell under test are excluded, so they are
+        ignored by the ordered-statistics calculation.
+        """
         # Calculate the boundaries of the window
         half_width = (self.n_guard_cells + self.window_width) // 2
-        init_i = index_i
         end_i = index_i + 2*half_width + 1
-        init_j = index_j
         end_j = index_j + 2*half_width + 1
-        window = np.copy(data[..., init_i:end_i, init_j:end_j])
-        # Convert to zero all values within the guard area, so they are ignored
-        # by the ordered-statistics calculation
-        window[..., init_i+self.window_width//2 : end_i-self.window_width//2,
-               init_j+self.window_width//2 : end_j-self.window_width//2] = 0
+        window = data[..., index_i:end_i, index_j:end_j]
         # Merge last two dimensions into one, making sorting operation simpler
-        flattened_window = window.reshape(window.shape[:-2] + ((2*half_width+1)**2,))
+        flattened_window = window[..., self.training_mask_2d()]
         return flattened_window
 
 
+    def select_engine(self, data, mask):
+        """
+        Choose the engine for computing the thresholds
+
+        The sliding engines only pay off for wide windows, as their cost
+        per cell depends on the number of cells entering and leaving the
+        window (4 for a 1D window) instead of the number of training cells.
+        The histogram engine needs integer data with a small range of values.
+        """
+        if self.engine != "auto":
+            return self.engine
+        n_train = np.count_nonzero(mask)
+        # Scale the thresholds by the moves relative to a 1D window
+        move_factor = max(1, len(self.sliding_moves(mask)) // 4)
+        # The highest and lowest values are found with a plain reduction
+        if self.ordered_k in (0, n_train-1):
+            engine = "vectorized"
+        elif (np.issubdtype(data.dtype, np.integer)
+                and n_train >= MIN_HISTOGRAM_TRAIN*move_factor
+                and int(data.max()) - int(data.min()) < MAX_HISTOGRAM_LEVELS):
+            engine = "histogram"
+        elif n_train >= MIN_SLIDING_TRAIN*move_factor:
+            engine = "sliding"
+        else:
+            engine = "vectorized"
+        return engine
+
+
+    def detect(self, data, padded_data, mask):
+        """
+        Compute the thresholds with the selected engine and detect objects
+
+        The padded data has shape (rows, doppler_bins, range_bins), and the
+        mask covers the last two axes.
+        """
+        self.check_window()
+        engine = self.select_engine(data, mask)
+        if engine == "vectorized":
+            windows = np.lib.stride_tricks.sliding_window_view(
+                padded_data, mask.shape, axis=(-2, -1))
+            threshold = self.order_statistic(windows, mask)
+        elif engine == "sliding":
+            threshold = self.sliding_order_statistic(padded_data, mask)
+        elif engine == "histogram":
+            levels = np.unique(padded_data)
+            if levels.size > MAX_HISTOGRAM_LEVELS + 1:
+                raise ValueError("Too many distinct values for the histogram "
+                                 "engine: {}".format(levels.size))
+            threshold = self.sliding_order_statistic(padded_data, mask, levels)
+        threshold = threshold.reshape(data.shape).astype(data.dtype, copy=False)
+        # Compute object detection
+        result = self.detections(data, threshold)
+        return result
+
+
+    def order_statistic(self, windows, mask, ordered_k=None):
+        """
+        Find the kth highest training cell of every window
+
+        The first two axes of the windows view are processed in chunks,
+        so the gathered training cells never exceed CHUNK_ELEMENTS.
+        The last mask.ndim axes of the view are the window axes.
+
+        @ordered_k: k, by default the one of the detector. For a sequence
+            of values, all of them are selected with a single partition
+            and stacked on a new last axis
+        """
+        if ordered_k is None:
+            ordered_k = self.ordered_k
+        out_shape = windows.shape[:-mask.ndim]
+        n_train = np.count_nonzero(mask)
+        for k in np.ravel(ordered_k):
+            if not 0 <= k < n_train:
+                raise ValueError("ordered_k {} out of range for {} training "
+                                 "cells".format(k, n_train))
+        # Index of the kth highest value in ascending order
+        rank = n_train - 1 - np.asarray(ordered_k)
+        threshold = self.scratch(
+            "threshold", out_shape + rank.shape, windows.dtype)
+        n_rows, n_cells = out_shape[:2]
+        cell_size = int(np.prod(out_shape[2:], dtype=int)) * n_train
+        step = max(1, CHUNK_ELEMENTS // cell_size)
+        if step >= n_cells:
+            row_step, cell_step = min(step // n_cells, n_rows), n_cells
+        else:
+            row_step, cell_step = 1, step
+        # Contiguous buffer for the training cells, so the partition runs
+        # over unit-stride rows
+        buffer = self.scratch(
+            "train_cells",
+            (row_step, cell_step) + out_shape[2:] + (n_train,),
+            windows.dtype)
+        runs = self.training_runs(mask)
+        for i in range(0, n_rows, row_step):
+            for j in range(0, n_cells, cell_step):
+                chunk = windows[i:i+row_step, j:j+cell_step]
+                train_cells = buffer[:chunk.shape[0], :chunk.shape[1]]
+                for index, pos, n_run in runs:
+                    train_cells[..., pos:pos+n_run] = chunk[index]
+                threshold[i:i+row_step, j:j+cell_step] = self.select(
+                    train_cells, rank)
+        return threshold
+
+
+    def sliding_order_statistic(self, padded_data, mask, levels=None):
+        """
+        Find the kth highest training cell of every window, sliding along
+        the range axis
+
+        Every cell is assigned a level, with level 0 being the highest
+        value. If levels is None, the level is the rank of the cell within
+        its band of Doppler rows. Otherwise, levels holds the sorted values
+        that the data can take, and cells are counted by value (histogram
+        variant).
+        """
+        n_rows = padded_data.shape[0]
+        n_win_rows, n_win_cols = mask.shape
+        n_bands = padded_data.shape[1] - n_win_rows + 1
+        n_cells = padded_data.shape[2] - n_win_cols + 1
+        threshold = self.scratch(
+            "threshold", (n_rows, n_bands, n_cells), padded_data.dtype)
+        # Each band holds the Doppler rows covered by one row of windows
+        bands = np.lib.stride_tricks.sliding_window_view(
+            padded_data, n_win_rows, axis=1)
+        band_size = n_win_rows * padded_data.shape[2]
+        step = max(1, CHUNK_ELEMENTS // band_size)
+        if step >= n_bands:
+            row_step, band_step = min(step // n_bands, n_rows), n_bands
+        else:
+            row_step, band_step = 1, step
+        for i in range(0, n_rows, row_step):
+            for j in range(0, n_bands, band_step):
+                chunk = np.moveaxis(bands[i:i+row_step, j:j+band_step], -1, -2)
+                chunk_shape = chunk.shape[:2]
+                chunk = chunk.reshape(-1, band_size)
+                if levels is None:
+                    # Rank every cell within its band
+                    order = np.argsort(chunk, axis=-1)
+                    band_levels = np.empty_like(order)
+                    np.put_along_axis(
+                        band_levels, order, np.arange(band_size)[::-1], axis=-1)
+                    band_values = np.take_along_axis(chunk, order[:, ::-1], axis=-1)
+                    n_levels = band_size
+                else:
+                    band_levels = levels.size - 1 - np.searchsorted(levels, chunk)
+                    n_levels = levels.size
+                # Move the bands to the last axis, so that the cells
+                # updated at every step are contiguous
+                band_levels = np.ascontiguousarray(band_levels.reshape(
+                    -1, n_win_rows, padded_data.shape[2]).transpose(1, 2, 0))
+                kth_levels = self.slide_windows(band_levels, mask, n_levels).T
+                if levels is None:
+                    kth_values = np.take_along_axis(band_values, kth_levels, axis=-1)
+                else:
+                    kth_values = levels[::-1][kth_levels]
+                threshold[i:i+row_step, j:j+band_step] = kth_values.reshape(
+                    chunk_shape + (n_cells,))
+        return threshold
+
+
+    @staticmethod
+    def sliding_moves(mask):
+        """
+        Cells leaving and entering the training set when the window moves
+        to the next range bin
+
+        Each move is given as (window row, window column, delta), where
+        delta is -1 for leaving cells and +1 for entering cells. Columns
+        of entering cells are relative to the previous window position.
+        """
+        prev_mask = np.zeros_like(mask)
+        prev_mask[:, 1:] = mask[:, :-1]
+        next_mask = np.zeros_like(mask)
+        next_mask[:, :-1] = mask[:, 1:]
+        moves = [(i, j, -1) for i, j in zip(*np.nonzero(mask & ~prev_mask))]
+        moves += [(i, j+1, 1) for i, j in zip(*np.nonzero(mask & ~next_mask))]
+        return moves
+
+
+    def slide_windows(self, band_levels, mask, n_levels):
+        """
+        Slide the training window along the range axis of every band
+
+        band_levels has shape (window_rows, range_bins, bands). As the
+        window moves one range bin, only the cells leaving and entering
+        the training set update the counts per level and per block of
+        levels. The kth highest level is then found with a two-level
+        search, first over the blocks and then within the block.
+
+        Return the kth highest level of every window, with shape
+        (range_cells, bands).
+        """
+        n_train = np.count_nonzero(mask)
+        if not 0 <= self.ordered_k < n_train:
+            raise ValueError("ordered_k {} out of range for {} training cells"
+                             "".format(self.ordered_k, n_train))
+        n_bands = band_levels.shape[-1]
+        n_cells = band_levels.shape[1] - mask.shape[1] + 1
+        moves = self.sliding_moves(mask)
+        # Counts per level and per block of levels, with bands on the
+        # last axis
+        block = int(np.ceil(np.sqrt(n_levels)))
+        n_blocks = -(-n_levels // block)
+        band_index = np.arange(n_bands)
+        init_levels = band_levels[np.nonzero(mask)]
+        cells = np.bincount(
+            (init_levels*n_bands + band_index).ravel(),
+            minlength=n_blocks*block*n_bands
+        ).reshape(n_blocks, block, n_bands)
+        blocks = cells.sum(axis=1)
+        flat_cells = cells.reshape(-1)
+        flat_blocks = blocks.reshape(-1)
+        block_offset = np.arange(block)[:, None] * n_bands
+        kth_levels = np.empty((n_cells, n_bands), dtype=np.intp)
+        for cell in range(n_cells):
+            # Find the block holding the kth highest level
+            block_count = np.cumsum(blocks, axis=0)
+            block_n = np.argmax(block_count > self.ordered_k, axis=0)
+            above = block_count[block_n, band_index] - blocks[block_n, band_index]
+            # Find the level within the block
+            block_cells = flat_cells[block_offset + block_n*block*n_bands + band_index]
+            cell_count = np.cumsum(block_cells, axis=0) + above
+            cell_n = np.argmax(cell_count > self.ordered_k, axis=0)
+            kth_levels[cell] = block_n*block + cell_n
+            if cell == n_cells - 1:
+                break
+            # Slide the window one range bin. Each update touches a single
+            # cell per band, so there are no repeated indices
+            for move_i, move_j, delta in moves:
+                moved = band_levels[move_i, cell+move_j]
+                flat_cells[moved*n_bands + band_index] += delta
+                flat_blocks[(moved // block)*n_bands + band_index] += delta
+        return kth_levels
+
+
+    @staticmethod
+    def select(train_cells, rank):
+        """
+        Return the value with the given ascending rank along the last axis
+
+        For an array of ranks, the values are stacked on the last axis.
+        The partition is done in place, so train_cells is modified.
+        """
+        if rank.ndim > 0:
+            train_cells.partition(rank, axis=-1)
+            return train_cells[..., rank]
+        if rank == train_cells.shape[-1] - 1:
+            return train_cells.max(axis=-1)
+        if rank == 0:
+            return train_cells.min(axis=-1)
+        train_cells.partition(rank, axis=-1)
+        return train_cells[..., rank]
+
+
+    @staticmethod
+    def training_runs(mask):
+        """
+        Split the training mask into runs of contiguous cells
+
+        Each run is given as (window index, position, length), meaning
+        that window[index] goes to the position of the gathered training
+        cells.
+        """
+        runs = []
+        pos = 0
+        rows = mask.reshape(-1, mask.shape[-1])
+        for row_n, row in enumerate(rows):
+            edges = np.flatnonzero(np.diff(np.r_[0, row.astype(int), 0]))
+            row_index = np.unravel_index(row_n, mask.shape[:-1])
+            for init, end in zip(edges[::2], edges[1::2]):
+                index = (Ellipsis,) + row_index + (slice(init, end),)
+                runs.append((index, pos, end - init))
+                pos += end - init
+        return runs
+
+
+    def sweep(self, in_data, alphas, ordered_k=None, out_format="dense"):
+        """
+        Run the detector for every combination of alpha and ordered_k
+
+        The training cells are gathered once, and the thresholds of all
+        the ordered_k values are selected with a single partition of each
+        window, whatever the engine. Every alpha then only costs a
+        comparison. The detections are the same as setting alpha and
+        ordered_k and calling the detector.
+
+        @ordered_k: Sequence of ordered_k values. By default, the one of
+            the detector
+        @out_format: 'dense' for a boolean array of shape
+            (n_ordered_k, n_alphas) + input shape, 'counts' for the number
+            of detections with shape (n_ordered_k, n_alphas)
+        """
+        data = self.sweep_input(in_data)
+        if ordered_k is None:
+            ordered_k = [self.ordered_k]
+        if self.n_dims == 1 and not self.symmetric_window():
+            thresholds = np.stack([self.threshold_1d_reference(data, k)
+                                   for k in ordered_k])
+            return self.sweep_detections(data, thresholds, alphas, out_format)
+        self.check_window()
+        padded_data = self.padding(data)
+        if self.n_dims == 1:
+            mask = self.training_mask_1d().reshape(1, -1)
+            padded_data = padded_data.reshape(-1, 1, padded_data.shape[-1])
+        elif self.n_dims == 2:
+            mask = self.training_mask_2d()
+            padded_data = padded_data.reshape((-1,) + padded_data.shape[-2:])
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded_data, mask.shape, axis=(-2, -1))
+        threshold = self.order_statistic(windows, mask, list(ordered_k))
+        thresholds = np.moveaxis(threshold, -1, 0).reshape(
+            (-1,) + data.shape).astype(data.dtype, copy=False)
+        return self.sweep_detections(data, thresholds, alphas, out_format)
+
+
     def run_1d(self, data):
         """
         Run the OS-CFAR in 1D
         """
+        if self.engine == "reference" or (
+                self.engine == "auto" and not self.symmetric_window()):
+            return self.run_1d_reference(data)
+        # A 1D window is handled as a 2D window with a single Doppler row
+        mask = self.training_mask_1d().reshape(1, -1)
+        padded_data = self.padding(data)
+        padded_data = padded_data.reshape(-1, 1, padded_data.shape[-1])
+        result = self.detect(data, padded_data, mask)
+        return result
+
+
+    def threshold_1d_reference(self, data, ordered_k=None):
+        """
+        Compute the 1D threshold, iterating over every cell
+
+        @ordered_k: k, by default the one of the detector
+        """
+        if ordered_k is None:
+            ordered_k = self.ordered_k
         padded_data = self.padding(data)
         threshold = np.zeros_like(data)
         for index in range(data.shape[-1]):
             window = self.get_window_1d(padded_data, index)
             # Find the kth highest value in the window
             ordered_window = np.sort(window, axis=-1)[..., ::-1]
-            threshold[..., index] = ordered_window[..., self.ordered_k]
+            threshold[..., index] = ordered_window[..., ordered_k]
+        return threshold
+
+
+    def run_1d_reference(self, data):
+        """
+        Run the OS-CFAR in 1D, iterating over every cell
+        """
         # Compute object detection
-        result = data*self.alpha > threshold
+        result = self.detections(data, self.threshold_1d_reference(data))
         return result
 
 
@@ -113,6 +439,19 @@ class OSCFAR(pyrads.algorithm.Algorithm):
         """
         Run the OS-CFAR in 2D
         """
+        if self.engine == "reference":
+            return self.run_2d_reference(data)
+        mask = self.training_mask_2d()
+        padded_data = self.padding(data)
+        padded_data = padded_data.reshape((-1,) + padded_data.shape[-2:])
+        result = self.detect(data, padded_data, mask)
+        return result
+
+
+    def run_2d_reference(self, data):
+        """
+        Run the OS-CFAR in 2D, iterating over every cell
+        """
         padded_data = self.padding(data)
         threshold = np.zeros_like(data)
         for i in range(data.shape[-2]):
@@ -122,13 +461,5 @@ class OSCFAR(pyrads.algorithm.Algorithm):
                 ordered_window = np.sort(window, axis=-1)[..., ::-1]
                 threshold[..., i, j] = ordered_window[..., self.ordered_k]
         # Compute object detection
-        result = data*self.alpha > threshold
-        return result
-
-
-    def _run(self, in_data):
-        if self.n_dims== 1:
-            result = self.run_1d(in_data)
-        elif self.n_dims==2:
-            result = self.run_2d(in_data)
+        result = self.detections(data, threshold)
         return result
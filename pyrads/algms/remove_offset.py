@@ -13,11 +13,20 @@ class RemoveOffset(pyrads.algorithm.Algorithm):
     Parent class for radar algorithms
     """
     NAME = "RemoveOffset"
+    FUSIBLE = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
 
+    @property
+    def n_signal_dims(self):
+        """
+        Each ramp is processed independently
+        """
+        return 1
+
+
     def calculate_out_shape(self):
         """
         Do not alter the data dimensionality
@@ -32,6 +41,8 @@ class RemoveOffset(pyrads.algorithm.Algorithm):
         Apply the algorithm only on last dimension.
         """
         # Remove DC offset across samples per ramp
-        offset = np.mean(in_data, -1)
-        result = in_data - np.expand_dims(offset, -1) 
+        offset = np.mean(in_data, -1, keepdims=True)
+        dtype = np.result_type(in_data, offset)
+        result = np.subtract(
+            in_data, offset, out=self.destination(in_data, dtype))
         return result
@@ -13,6 +13,7 @@ class Scale(pyrads.algorithm.Algorithm):
     Class for scaling data with a constant value
     """
     NAME = "Scale"
+    FUSIBLE = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -21,6 +22,14 @@ class Scale(pyrads.algorithm.Algorithm):
         self.mode = kwargs.get("mode", "fixed")
 
 
+    @property
+    def n_signal_dims(self):
+        """
+        Each ramp is processed independently
+        """
+        return 1
+
+
     def calculate_out_shape(self):
         """
         Do not alter the data dimensionality
@@ -34,12 +43,14 @@ class Scale(pyrads.algorithm.Algorithm):
 
         Apply the algorithm only on last dimension.
         """
+        # Integer data is promoted to float, as with the / operator
+        dtype = in_data.dtype if in_data.dtype.kind in "fc" else np.dtype(float)
         # Remove DC offset across samples per ramp
         if self.mode == "fixed":
-            result = in_data / self.scaling_factor
+            scale_factor = self.scaling_factor
         elif self.mode == "max":
-            data_max = in_data.max(axis=-1)
+            data_max = in_data.max(axis=-1, keepdims=True)
             scale_factor = np.where(data_max==0, 1, data_max)
-            scale_shape = scale_factor.shape + (1,)
-            result = in_data /scale_factor.reshape(scale_shape)
+        result = np.divide(
+            in_data, scale_factor, out=self.destination(in_data, dtype))
         return result
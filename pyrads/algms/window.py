@@ -17,6 +17,7 @@ class Window(pyrads.algorithm.Algorithm):
     Parent class for radar algorithms
     """
     NAME = "Window"
+    FUSIBLE = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -32,13 +33,25 @@ class Window(pyrads.algorithm.Algorithm):
                           "of input shape {1}".format(self.axis,
                                                       self.in_data_shape
                          ))
+        # Leading axes before the window axis are left to the ellipsis
         self.indices_str = ""
-        for i in range(97, 97+self.n_dim):
+        for i in range(97, 97+self.n_signal_dims):
             self.indices_str += chr(i)
-        self.axis_str = self.indices_str[self.axis]
-        self.einsum_str = self.indices_str
+        self.axis_str = self.indices_str[0]
+        self.einsum_str = '...' + self.indices_str
         self.einsum_str += ',' + self.axis_str
-        self.einsum_str += '->' + self.indices_str
+        self.einsum_str += '->...' + self.indices_str
+        # Window broadcastable against the input, for in-place products
+        window_shape = (self.n_samples,) + (1,) * (self.n_signal_dims-1)
+        self.window_nd = self.window.reshape(window_shape)
+
+
+    @property
+    def n_signal_dims(self):
+        """
+        The window axis and the axes after it
+        """
+        return -self.axis if self.axis < 0 else self.n_dim - self.axis
 
 
     def calculate_out_shape(self):
@@ -68,5 +81,11 @@ class Window(pyrads.algorithm.Algorithm):
 
         Apply algorithm only on last dimension.
         """
-        result = np.einsum(self.einsum_str, in_data, self.window)
+        window = self.cast(self.window)
+        dtype = np.result_type(in_data, window)
+        out = self.destination(in_data, dtype)
+        if out is in_data:
+            result = np.multiply(in_data, self.cast(self.window_nd), out=out)
+        else:
+            result = np.einsum(self.einsum_str, in_data, window, out=out)
         return result
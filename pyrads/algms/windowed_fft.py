@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Windowed FFT algorithm
+
+Fuses the Window and the range FFT algorithms in a single stage. The
+window coefficients are applied chunk by chunk right before the
+transform, so the full windowed cube is never created.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+import pyrads.algms.fft
+import pyrads.algms.window
+
+
+# Number of input elements transformed at once
+CHUNK_ELEMENTS = 2**16
+
+
+class WindowedFFT(pyrads.algms.fft.FFT):
+    """
+    Window on the samples axis followed by a range or range-Doppler FFT
+
+    Takes the parameters of both the Window and the FFT algorithms. The
+    window is always applied on the last axis, i.e. the FFT range axis.
+    """
+    NAME = "WindowedFFT"
+    TYPES = ("range", "range-doppler")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window_type = kwargs.get("window_type", "hann")
+        self.window_alg = pyrads.algms.window.Window(
+            self.in_data_shape,
+            window_type=self.window_type,
+            axis=-1
+        )
+        # Fold all the FFT normalizations into the window coefficients
+        norm = self.range_norm
+        if self.type == "range-doppler":
+            norm *= self.doppler_norm
+        self.coefficients = self.window_alg.window / norm
+        # Chunks are made of whole ramps-by-samples maps, which is also the
+        # scope of the logarithmic output format
+        self.unit_ndim = min(2, len(self.in_data_shape))
+        unit_size = np.prod(self.in_data_shape[-self.unit_ndim:])
+        self.chunk_units = max(1, CHUNK_ELEMENTS // unit_size)
+
+
+    @property
+    def n_signal_dims(self):
+        """
+        The chunks are whole maps, even for the range FFT
+        """
+        return self.unit_ndim
+
+
+    def transform(self, block):
+        """
+        Apply the window and the FFT to a chunk of data
+        """
+        spectrum = self.range_fft(block * self.cast(self.coefficients), norm=1)
+        if self.type == "range-doppler":
+            spectrum = self.doppler_fft(spectrum, norm=1)
+        return spectrum
+
+
+    def _run(self, in_data):
+        """
+        Return the FFT of the windowed data, chunk by chunk
+
+        The output is formatted per chunk, except for the unitary format,
+        which needs the global minimum and maximum of the output.
+        """
+        unit_shape = self.in_data_shape[-self.unit_ndim:]
+        data = in_data.reshape((-1,) + unit_shape)
+        n_batch_dims = len(self.in_data_shape) - self.n_signal_dims
+        # Same type promotion as a Window stage followed by an FFT stage
+        spectrum_dtype = np.result_type(
+            data, self.cast(self.coefficients), np.complex64)
+        if self.unitary:
+            # Keep the complex spectrum and format it as a whole at the end
+            out_unit_shape = unit_shape[:-1] + (self.n_real_bins,)
+            out_dtype = spectrum_dtype
+        else:
+            out_unit_shape = self.out_data_shape[n_batch_dims:]
+            out_dtype = spectrum_dtype
+            if self.out_format != "complex":
+                out_dtype = np.finfo(spectrum_dtype).dtype
+        result = self.scratch(
+            "result", (data.shape[0],) + out_unit_shape, out_dtype)
+        for start in range(0, data.shape[0], self.chunk_units):
+            chunk = slice(start, start+self.chunk_units)
+            spectrum = self.transform(data[chunk])
+            if self.unitary:
+                result[chunk] = spectrum
+            else:
+                result[chunk] = self.format_fft(spectrum)
+        if self.unitary:
+            result = self.format_fft(result)
+        result = result.reshape(self.out_shape(in_data.shape))
+        return result
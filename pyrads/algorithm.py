@@ -11,18 +11,87 @@ import numpy as np
 class Algorithm(ABC):
     """
     Parent class for radar algorithms
+
+    Only the last n_signal_dims axes of in_data_shape are fixed. The
+    leading axes are batch axes, e.g. frames or antennas, and the same
+    instance runs on inputs with any number and size of batch axes.
+
+    Common parameters:
+        reuse_buffers: if True, the output and the large work arrays are
+            allocated once and overwritten on every call (default False).
+            The returned array is then only valid until the next call
+        in_place: if True, algorithms that support it overwrite their
+            input when its type allows it (default False)
+        dtype: floating point precision of the algorithm, e.g. float32.
+            Real and integer inputs are converted to it, complex inputs
+            to the complex type of the same precision. By default, the
+            types follow the numpy promotion rules
+
+    Algorithms with FUSIBLE set compute each output entry from the same
+    entry of the signal axes of the input, so Pipeline.compile can run
+    several of them in a row over one block of entries at a time.
+
+    The functions in pre_hooks are called as hook(algorithm, in_data)
+    before every run, and those in post_hooks as
+    hook(algorithm, in_data, out_data) after it, e.g. by
+    pyrads.utils.profiler.Profiler.
     """
+    FUSIBLE = False
+    # Attributes that do not change the results, so they are not part of
+    # the cache keys of pyrads.cache
+    STATE_ATTRIBUTES = ("output", "_buffers", "pre_hooks", "post_hooks",
+                        "reuse_buffers", "in_place")
+
     def __init__(self, in_data_shape, **kwargs):
         self.in_data_shape = in_data_shape
         self.out_data_shape = kwargs.get("out_data_shape", None)
+        self.reuse_buffers = kwargs.get("reuse_buffers", False)
+        self.in_place = kwargs.get("in_place", False)
+        self._buffers = {}
+        self.pre_hooks = []
+        self.post_hooks = []
+        self.dtype = kwargs.get("dtype", None)
+        if self.dtype is not None:
+            self.set_dtype(self.dtype)
         if not self.out_data_shape:
             self.calculate_out_shape()
-        self.output = np.zeros(self.out_data_shape)
+        self.output = np.zeros(self.out_data_shape, dtype=self.real_dtype())
 
     @abstractmethod
     def calculate_out_shape(self):
         pass
 
+    @property
+    def n_signal_dims(self):
+        """
+        Number of trailing axes the algorithm works on
+
+        By default all the axes of the input shape are fixed.
+        """
+        return len(self.in_data_shape)
+
+    def accepts(self, in_shape):
+        """
+        Check that the signal axes of an input shape match in_data_shape
+        """
+        n_batch_dims = len(in_shape) - self.n_signal_dims
+        n_fixed_batch_dims = len(self.in_data_shape) - self.n_signal_dims
+        signal_shape = tuple(self.in_data_shape[n_fixed_batch_dims:])
+        return n_batch_dims >= 0 and tuple(in_shape[n_batch_dims:]) == signal_shape
+
+    def out_shape(self, in_shape):
+        """
+        Return the output shape for an input with any batch axes
+        """
+        if not self.accepts(in_shape):
+            raise ValueError(
+                "Input shape {} does not match with algorithm input shape {}"
+                "".format(in_shape, self.in_data_shape))
+        n_batch_dims = len(in_shape) - self.n_signal_dims
+        n_fixed_batch_dims = len(self.in_data_shape) - self.n_signal_dims
+        return (tuple(in_shape[:n_batch_dims])
+                + tuple(self.out_data_shape[n_fixed_batch_dims:]))
+
     @abstractmethod
     def _run(self, in_data):
         """
@@ -30,16 +99,108 @@ class Algorithm(ABC):
         """
         pass
 
+    def set_dtype(self, dtype):
+        """
+        Set the floating point precision of the algorithm
+
+        Complex types set the precision of their real part.
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind not in "fc":
+            raise ValueError("Invalid dtype: {}".format(dtype))
+        self.dtype = np.finfo(dtype).dtype
+
+    def real_dtype(self):
+        """
+        Return the real type used for new arrays
+        """
+        return np.dtype(float) if self.dtype is None else self.dtype
+
+    def cast(self, data):
+        """
+        Convert numeric data to the precision of the algorithm
+
+        Data is returned unchanged if no precision is set or if it is not
+        a numeric array, e.g. boolean detections.
+        """
+        numeric = isinstance(data, np.ndarray) and data.dtype.kind in "iufc"
+        if self.dtype is None or not numeric:
+            return data
+        dtype = self.dtype
+        if data.dtype.kind == "c":
+            dtype = np.result_type(dtype, np.complex64)
+        return data.astype(dtype, copy=False)
+
+    def scratch(self, name, shape, dtype=float):
+        """
+        Return an uninitialized work array
+
+        The array is kept between calls when buffers are reused, and only
+        allocated again if the shape or the type changes.
+        """
+        dtype = np.dtype(dtype)
+        if not self.reuse_buffers:
+            return np.empty(shape, dtype)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+        return buffer
+
+    def out_buffer(self, shape, dtype=float):
+        """
+        Return the persistent output array, or None if buffers are not reused
+
+        Meant for the out argument of numpy functions.
+        """
+        if not self.reuse_buffers:
+            return None
+        return self.scratch("output", shape, dtype)
+
+    def destination(self, in_data, dtype):
+        """
+        Return the array an elementwise algorithm should write into
+
+        This is the input itself when working in place is enabled and safe,
+        otherwise the output buffer.
+        """
+        in_place = (self.in_place
+                    and isinstance(in_data, np.ndarray)
+                    and in_data.dtype == dtype
+                    and in_data.shape == self.out_shape(in_data.shape)
+                    and in_data.flags.writeable)
+        if in_place:
+            return in_data
+        return self.out_buffer(in_data.shape, dtype)
+
+    def release(self):
+        """
+        Drop the reference to the last output, so its memory can be freed
+
+        Buffers kept with reuse_buffers are not released.
+        """
+        self.output = None
+
     def __call__(self, in_data):
         """
         Call for the algorithm class. Do not modify in children class
         """
-        self.output = self._run(in_data)
+        for hook in self.pre_hooks:
+            hook(self, in_data)
+        out_data_shape = self.out_shape(in_data.shape)
+        self.output = self._run(self.cast(in_data))
+        # Some numpy versions compute in double precision, e.g. the FFT
+        floating = (isinstance(self.output, np.ndarray)
+                    and self.output.dtype.kind in "fc")
+        if floating:
+            self.output = self.cast(self.output)
         # Check dimensionality
-        if self.output.shape != self.out_data_shape:
+        if self.output.shape != out_data_shape:
             raise ValueError(
                 "Output shape {} does not match with expected shape {}"
-                "".format(self.output.shape, self.out_data_shape))
+                "".format(self.output.shape, out_data_shape))
+        for hook in self.post_hooks:
+            hook(self, in_data, self.output)
         return self.output
 
     def __repr__(self):
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of the stage outputs of a pipeline
+
+The output of every stage is keyed by a hash of the pipeline input and of
+the parameters of that stage and of all the stages before it. A pipeline
+with a cache only runs the stages after the longest prefix of the chain
+that is already cached, e.g. only the CFAR when sweeping its parameters.
+"""
+# Standard libraries
+import collections
+import hashlib
+import os
+import pickle
+import threading
+import numpy as np
+# Local libraries
+import pyrads.algorithm
+import pyrads.detections
+
+
+def array_digest(data):
+    """
+    Return the hash of the type, shape and contents of an array
+    """
+    data = np.ascontiguousarray(data)
+    digest = hashlib.sha256()
+    digest.update("{}{}".format(data.dtype.str, data.shape).encode())
+    digest.update(memoryview(data).cast("B"))
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    """
+    Add a parameter value to a hash, going into containers and algorithms
+    """
+    if isinstance(value, np.ndarray):
+        digest.update(array_digest(value).encode())
+    elif isinstance(value, pyrads.algorithm.Algorithm):
+        digest.update(algorithm_digest(value).encode())
+    elif isinstance(value, (list, tuple)):
+        digest.update("{}{}".format(type(value).__name__, len(value)).encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, dict):
+        digest.update("dict{}".format(len(value)).encode())
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, value[key])
+    else:
+        digest.update(repr(value).encode())
+
+
+def algorithm_digest(alg):
+    """
+    Return the hash of the class and the parameters of an algorithm
+
+    All the attributes are parameters, except the ones listed in the
+    STATE_ATTRIBUTES of the algorithm.
+    """
+    digest = hashlib.sha256()
+    digest.update("{}.{}".format(type(alg).__module__,
+                                 type(alg).__qualname__).encode())
+    for name, value in sorted(vars(alg).items()):
+        if name in alg.STATE_ATTRIBUTES:
+            continue
+        digest.update(name.encode())
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def chain_key(in_key, alg):
+    """
+    Return the cache key of the output of an algorithm, from the key of
+    its input
+    """
+    return hashlib.sha256((in_key + algorithm_digest(alg)).encode()).hexdigest()
+
+
+def chain_keys(in_data, algorithms):
+    """
+    Return the cache key of the output of every algorithm of a chain
+    """
+    key = array_digest(in_data)
+    keys = []
+    for alg in algorithms:
+        key = chain_key(key, alg)
+        keys.append(key)
+    return keys
+
+
+def _entry_bytes(data):
+    """
+    Return the memory taken by a cached output
+
+    Memory mapped outputs of the disk tier are not counted.
+    """
+    if isinstance(data, np.memmap):
+        return 0
+    return getattr(data, "nbytes", 0)
+
+
+def _read_only(data):
+    """
+    Mark the arrays of a stage output as read-only
+    """
+    if isinstance(data, pyrads.detections.Detections):
+        for array in (data.coords, data.power, data.margin):
+            array.flags.writeable = False
+    elif isinstance(data, np.ndarray):
+        data.flags.writeable = False
+    return data
+
+
+class ResultCache():
+    """
+    Least recently used cache of stage outputs, with a byte budget
+
+    Stored outputs are read-only, so algorithms working in place copy
+    them instead of changing the cached values. When a directory is
+    given, every stored output is also written there, and outputs not
+    found in memory are looked up on disk. The disk tier has no budget
+    and can be shared between runs and processes.
+
+    @max_bytes: Maximum size of the outputs kept in memory
+    @directory: Folder of the disk tier, or None to keep only memory
+    """
+    def __init__(self, max_bytes=2**30, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _path(self, key, data=None):
+        """
+        Return the disk tier file of a key, for an array or another output
+        """
+        npy_path = os.path.join(self.directory, key + ".npy")
+        if data is None:
+            return npy_path if os.path.exists(npy_path) else npy_path[:-4] + ".pkl"
+        return npy_path if isinstance(data, np.ndarray) else npy_path[:-4] + ".pkl"
+
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.directory is not None and os.path.exists(self._path(key))
+
+
+    def get(self, key):
+        """
+        Return the output stored under a key, or None if it is not cached
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.directory is not None and os.path.exists(self._path(key)):
+            path = self._path(key)
+            if path.endswith(".npy"):
+                data = np.load(path, mmap_mode="r")
+            else:
+                with open(path, "rb") as data_file:
+                    data = _read_only(pickle.load(data_file))
+            # Memory mapped outputs only take memory once they are read
+            self._store(key, data)
+            with self._lock:
+                self.hits += 1
+            return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+
+    def put(self, key, data):
+        """
+        Store a stage output, which becomes read-only
+        """
+        _read_only(data)
+        if self.directory is not None and not os.path.exists(self._path(key, data)):
+            path = self._path(key, data)
+            # Write to a temporary file first, so readers never see a
+            # partial output
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "wb") as data_file:
+                if isinstance(data, np.ndarray):
+                    np.save(data_file, data)
+                else:
+                    pickle.dump(data, data_file)
+            os.replace(tmp_path, path)
+        self._store(key, data)
+
+
+    def _store(self, key, data):
+        """
+        Keep an output in memory, evicting the least recently used ones
+        """
+        n_bytes = _entry_bytes(data)
+        if n_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.n_bytes -= _entry_bytes(self._entries.pop(key))
+            self._entries[key] = data
+            self.n_bytes += n_bytes
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.n_bytes -= _entry_bytes(evicted)
+
+
+    def clear(self):
+        """
+        Drop the outputs kept in memory. The disk tier is not changed
+        """
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+
+    def stats(self):
+        """
+        Return the number of hits and misses and the memory in use
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "n_bytes": self.n_bytes,
+            }
+
+
+    def __getstate__(self):
+        # Locks cannot be copied to other processes, and the outputs in
+        # memory are not sent with them
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_entries"] = collections.OrderedDict()
+        state["n_bytes"] = 0
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Module containing the DAG pipeline class
+"""
+# Standard libraries
+import hashlib
+import logging
+import numpy as np
+# Local libraries
+import pyrads.algorithm
+import pyrads.algms.fused
+import pyrads.cache
+import pyrads.pipeline
+
+
+class DAGPipeline(pyrads.pipeline.Pipeline):
+    """
+    Pipeline whose stages form a tree, so several branches can share a
+    prefix
+
+    Every node has a unique id and takes the output of another node, or
+    the pipeline input for the INPUT id. Nodes can have any number of
+    consumers, and each node runs once per input. A run returns a
+    dictionary with the outputs of the requested nodes, by default the
+    ones without consumers. Every other output is released as soon as
+    its last consumer has run.
+
+    Chains added with add continue from the last added node, so a DAG
+    pipeline built like a Pipeline is a single branch.
+
+    @outputs: Ids of the nodes returned by a run, or None for the leaves
+    """
+    INPUT = "input"
+
+    def __init__(self, chain=[], dataset="", dtype=None, outputs=None,
+                 cache=None):
+        # Id of the node feeding every node
+        self._inputs = {}
+        self.outputs = outputs
+        super().__init__(chain, dataset, dtype, retain="final", cache=cache)
+
+
+    def add(self, chain, after=None):
+        """
+        Add a chain of algorithms or pipelines as a branch
+
+        @after: Id of the node feeding the first algorithm of the chain.
+            By default, the last added node
+        """
+        for element in chain:
+            if isinstance(element, pyrads.algorithm.Algorithm):
+                after = self.add_node(element, after)
+            elif isinstance(element, pyrads.pipeline.Pipeline):
+                for alg in element._algorithms.values():
+                    after = self.add_node(alg, after)
+            else:
+                raise TypeError("Input type invalid: {}".format(type(element)))
+
+
+    def add_node(self, algorithm, after=None, node_id=None):
+        """
+        Add an algorithm fed by the output of another node, and return its id
+
+        @after: Id of the node feeding the algorithm, or INPUT for the
+            pipeline input. By default, the last added node
+        @node_id: Unique id of the new node. By default, the NAME of the
+            algorithm, with a numeric suffix if it is already taken
+        """
+        if after is None:
+            after = [*self._algorithms][-1] if self._algorithms else self.INPUT
+        if after != self.INPUT and after not in self._algorithms:
+            raise ValueError("Unknown node: {}".format(after))
+        if node_id is None:
+            node_id = self.unique_name(algorithm.NAME)
+        elif node_id in self._algorithms or node_id == self.INPUT:
+            raise ValueError("Node id already in use: {}".format(node_id))
+        # Test that the input data format is compatible with the feeding node
+        if after != self.INPUT:
+            in_shape = self._algorithms[after].out_data_shape
+        elif self._in_data.size > 0:
+            in_shape = self._in_data.shape
+        else:
+            in_shape = algorithm.in_data_shape
+        if not algorithm.accepts(in_shape):
+            raise ValueError(
+                "Node {} with input shape {} does not accept the output "
+                "shape {} of {}".format(
+                    node_id, algorithm.in_data_shape, in_shape, after))
+        if self.dtype is not None and algorithm.dtype is None:
+            algorithm.set_dtype(self.dtype)
+        self._algorithms[node_id] = algorithm
+        self._inputs[node_id] = after
+        self._idle_replicas = []
+        return node_id
+
+
+    def consumers(self, node_id):
+        """
+        Return the ids of the nodes fed by a node
+        """
+        return [node for node, after in self._inputs.items() if after == node_id]
+
+
+    def leaves(self):
+        """
+        Return the ids of the nodes without consumers
+        """
+        fed = set(self._inputs.values())
+        return [node for node in self._algorithms if node not in fed]
+
+
+    def plan(self, outputs, keys):
+        """
+        Return the nodes to run, in order, and the cached outputs
+
+        Nodes are only run if their output is requested or needed by a
+        node that runs, and if it is not in the cache.
+
+        @keys: Cache keys of the nodes, empty if there is no cache
+        """
+        needed = set(outputs)
+        to_run = []
+        cached = {}
+        for node in reversed([*self._algorithms]):
+            if node not in needed:
+                continue
+            if keys:
+                data = self.cache.get(keys[node])
+                if data is not None:
+                    cached[node] = data
+                    continue
+            to_run.append(node)
+            needed.add(self._inputs[node])
+        return to_run[::-1], cached
+
+
+    def node_keys(self, in_data):
+        """
+        Return the cache key of every node, chained from its input
+        """
+        keys = {self.INPUT: pyrads.cache.array_digest(in_data)}
+        for node, alg in self._algorithms.items():
+            keys[node] = pyrads.cache.chain_key(keys[self._inputs[node]], alg)
+        return keys
+
+
+    def _run(self, in_data):
+        outputs = self.leaves() if self.outputs is None else list(self.outputs)
+        for node in outputs:
+            if node not in self._algorithms:
+                raise ValueError("Unknown output: {}".format(node))
+        for node in self.consumers(self.INPUT):
+            if not self._algorithms[node].accepts(in_data.shape):
+                raise ValueError(
+                    "Input shape {} does not match with input shape {} of {}"
+                    "".format(in_data.shape,
+                              self._algorithms[node].in_data_shape, node))
+        keys = {} if self.cache is None else self.node_keys(in_data)
+        to_run, values = self.plan(outputs, keys)
+        values[self.INPUT] = in_data
+        # Consumers still to run for every node
+        pending = {}
+        for node in to_run:
+            pending[self._inputs[node]] = pending.get(self._inputs[node], 0) + 1
+        for node in to_run:
+            after = self._inputs[node]
+            alg = self._algorithms[node]
+            data = values[after]
+            pending[after] -= 1
+            shared = pending[after] > 0 or after in outputs
+            if shared and isinstance(data, np.ndarray):
+                # The data is still needed, so it is passed read-only to
+                # keep in-place algorithms from changing it
+                data = data.view()
+                data.flags.writeable = False
+            values[node] = alg(data)
+            if self.cache is not None:
+                self._cache_output(keys[node], alg, data, values[node])
+            # The output is dropped once its last consumer has run
+            if pending[after] == 0 and after not in outputs:
+                del values[after]
+                if after != self.INPUT:
+                    self._algorithms[after].release()
+        return {node: values[node] for node in outputs}
+
+
+    def digest(self):
+        """
+        Return a hash of the pipeline, including the inputs of the nodes
+        and the requested outputs
+        """
+        digest = hashlib.sha256(super().digest().encode())
+        digest.update(repr((self._inputs, self.outputs)).encode())
+        return digest.hexdigest()
+
+
+    def fusible_input(self, node_id, outputs):
+        """
+        Return True if a node can be fused with the node feeding it
+
+        Both nodes must be fusible, and the feeding node can neither be
+        returned by a run nor feed other nodes.
+        """
+        after = self._inputs[node_id]
+        if after == self.INPUT or after in outputs:
+            return False
+        return (self._algorithms[node_id].FUSIBLE
+                and self._algorithms[after].FUSIBLE
+                and self.consumers(after) == [node_id])
+
+
+    def compile(self):
+        """
+        Return a DAG pipeline in which linear runs of fusible nodes are fused
+
+        Runs of fusible nodes where every node only feeds the next one are
+        replaced by one pyrads.algms.fused.Fused node, with the id of the
+        last node of the run. The other nodes keep their ids and inputs.
+        The ids of the fused nodes are listed in the fused attribute of
+        the new pipeline. Both pipelines share the algorithms.
+        """
+        outputs = self.leaves() if self.outputs is None else self.outputs
+        pipeline = DAGPipeline(dtype=self.dtype, outputs=self.outputs,
+                               cache=self.cache)
+        fused = []
+        # Runs are added by their last node, which comes after the last
+        # node of the run feeding them
+        for node in self._algorithms:
+            consumers = self.consumers(node)
+            if len(consumers) == 1 and self.fusible_input(consumers[0], outputs):
+                continue
+            run = [node]
+            while self.fusible_input(run[0], outputs):
+                run.insert(0, self._inputs[run[0]])
+            if len(run) > 1:
+                alg = pyrads.algms.fused.Fused(
+                    [self._algorithms[run_node] for run_node in run])
+                fused.append(run)
+            else:
+                alg = self._algorithms[node]
+            pipeline.add_node(alg, self._inputs[run[0]], node)
+        pipeline.fused = fused
+        for names in fused:
+            logging.info("Fused stages: {}".format(", ".join(names)))
+        return pipeline
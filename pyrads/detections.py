@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Module containing the sparse detections class
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+
+
+class Detections():
+    """
+    Sparse list of detections in coordinate (COO) format
+
+    Stores the indices of the detected cells instead of a dense boolean
+    array with the size of the full radar cube. The shape attribute is
+    the one of the equivalent dense array, so that the shape checks of
+    Algorithm and Pipeline work in the same way.
+
+    @coords: Array of shape (n_dims, n_detections) with the indices of
+        the detected cells, in C order
+    @power: Value of the data at each detected cell
+    @margin: Difference between the scaled cell value and the threshold
+    @shape: Shape of the equivalent dense array
+    """
+    def __init__(self, coords, power, margin, shape):
+        self.coords = coords
+        self.power = power
+        self.margin = margin
+        self.shape = tuple(shape)
+
+
+    @classmethod
+    def from_flat_index(cls, flat_index, shape, power, margin):
+        """
+        Create the detections from indices into the flattened dense array
+        """
+        coords = np.array(np.unravel_index(flat_index, shape))
+        coords = coords.reshape(len(shape), -1)
+        return cls(coords, power, margin, shape)
+
+
+    @classmethod
+    def concatenate(cls, parts):
+        """
+        Join detections of consecutive blocks along the first axis
+        """
+        offsets = np.cumsum([0] + [part.shape[0] for part in parts])
+        coords = np.concatenate(
+            [part.coords + np.eye(part.ndim, 1, dtype=part.coords.dtype)*offset
+             for part, offset in zip(parts, offsets)], axis=1)
+        power = np.concatenate([part.power for part in parts])
+        margin = np.concatenate([part.margin for part in parts])
+        shape = (int(offsets[-1]),) + parts[0].shape[1:]
+        return cls(coords, power, margin, shape)
+
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.power.nbytes + self.margin.nbytes
+
+
+    def to_dense(self):
+        """
+        Return the equivalent dense boolean array
+        """
+        dense = np.zeros(self.shape, dtype=bool)
+        dense[tuple(self.coords)] = True
+        return dense
+
+
+    def __len__(self):
+        return self.coords.shape[1]
+
+
+    def __repr__(self):
+        s = "{}(n_detections: {}, shape: {})".format(
+                type(self).__name__,
+                len(self),
+                self.shape
+            )
+        return s
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Parallel execution of pipelines over the batch axes
+
+ProcessExecutor splits the frame axis between worker processes, with the
+input and output cubes in shared memory. ThreadExecutor splits the batch
+axes in cache-sized chunks between threads, which suits the stages
+spending their time in NumPy kernels that release the GIL.
+StageExecutor runs every stage in its own thread, so that consecutive
+frames are in different stages at the same time.
+"""
+# Standard libraries
+import concurrent.futures
+import multiprocessing.shared_memory
+import os
+import queue
+import threading
+import time
+import numpy as np
+# Local libraries
+import pyrads.dag
+import pyrads.detections
+
+
+# Input bytes per chunk of the thread executor, sized for a core's L2 cache
+CHUNK_BYTES = 2**20
+# Pipeline of the worker process, set by the pool initializer
+_worker_pipeline = None
+# Queue item that ends a stage thread
+_STOP = object()
+
+
+def run_final(pipeline, in_data):
+    """
+    Run a pipeline and return its final output only
+    """
+    retain = pipeline.retain
+    pipeline.retain = "final"
+    try:
+        result = pipeline(in_data)
+    finally:
+        pipeline.retain = retain
+    return result
+
+
+def check_linear(pipeline):
+    """
+    Reject DAG pipelines, which return a dictionary of outputs
+    """
+    if isinstance(pipeline, pyrads.dag.DAGPipeline):
+        raise TypeError("Executors only run linear pipelines, not {}"
+                        "".format(type(pipeline).__name__))
+
+
+def _init_worker(pipeline):
+    """
+    Keep a copy of the pipeline in the worker process
+    """
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+    # Only the final output is sent back
+    _worker_pipeline.retain = "final"
+
+
+def _attach(spec):
+    """
+    Return the shared memory block and the array described by a spec
+    """
+    name, shape, dtype = spec
+    shm = multiprocessing.shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, array
+
+
+def _run_chunk(in_spec, out_spec, start, stop):
+    """
+    Run the worker pipeline on the frames start:stop of the shared input
+
+    Dense results are written into the shared output. Other results,
+    e.g. sparse detections, are returned.
+    """
+    in_shm, in_data = _attach(in_spec)
+    try:
+        result = _worker_pipeline(in_data[start:stop])
+        if out_spec is None:
+            return result
+        out_shm, out_data = _attach(out_spec)
+        try:
+            out_data[start:stop] = result
+        finally:
+            del out_data
+            out_shm.close()
+    finally:
+        del in_data
+        in_shm.close()
+    return None
+
+
+class ProcessExecutor():
+    """
+    Run a pipeline in a pool of processes, splitting the frame axis
+
+    Every worker holds its own copy of the pipeline, so the state the
+    algorithms keep after a run, e.g. DBSCAN.clusters, is not updated in
+    the calling process. The chunk results are put together in order:
+    dense outputs in a single array, sparse detections in a single
+    Detections object.
+
+    Algorithms whose result depends on the whole cube, e.g. the 1D CFAR
+    padding with the cube mean, see a single chunk at a time, so their
+    output can differ from a serial run.
+
+    The type of the output is found by running one frame in the calling
+    process, once for every frame shape and type.
+
+    The workers receive a copy of the pipeline when they start. If its
+    parameters have changed at the next call, the pool is started again
+    with the current pipeline, which costs the start-up of the workers.
+
+    Usable as a context manager, which shuts the pool down on exit.
+
+    @n_workers: Number of processes. By default, the number of CPUs
+    @chunk: Number of frames per task. By default, the frames are split
+        evenly between the workers
+    """
+    def __init__(self, pipeline, n_workers=None, chunk=None):
+        check_linear(pipeline)
+        self.pipeline = pipeline
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunk = chunk
+        # Output frame shape and type for every input frame shape and type,
+        # with None for sparse outputs
+        self._out_types = {}
+        self._pool = None
+        self._digest = None
+        self.start_pool()
+
+
+    def start_pool(self):
+        """
+        Start the worker processes with a copy of the current pipeline
+
+        A running pool is shut down first.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._out_types = {}
+        self._digest = self.pipeline.digest()
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_init_worker,
+            initargs=(self.pipeline,)
+        )
+
+
+    def chunk_limits(self, n_frames):
+        """
+        Return the first and last frame of every task
+        """
+        chunk = self.chunk or -(-n_frames // self.n_workers)
+        return [(start, min(start+chunk, n_frames))
+                for start in range(0, n_frames, chunk)]
+
+
+    @staticmethod
+    def shared_array(shape, dtype):
+        """
+        Return a new shared memory block and an array on top of it
+        """
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = multiprocessing.shared_memory.SharedMemory(
+            create=True, size=max(1, size))
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return shm, array
+
+
+    def out_type(self, in_data):
+        """
+        Return the shape and type of an output frame, or None if the
+        output is sparse
+        """
+        key = (in_data.shape[1:], in_data.dtype)
+        if key not in self._out_types:
+            sample = run_final(self.pipeline, in_data[:1])
+            self._out_types[key] = None
+            if isinstance(sample, np.ndarray):
+                self._out_types[key] = (sample.shape[1:], sample.dtype)
+        return self._out_types[key]
+
+
+    def __call__(self, in_data):
+        """
+        Run the pipeline over all the frames and return the final output
+        """
+        if self.pipeline.digest() != self._digest:
+            self.start_pool()
+        out_type = self.out_type(in_data)
+        blocks = [self.shared_array(in_data.shape, in_data.dtype)]
+        if out_type is not None:
+            out_shape = (in_data.shape[0],) + out_type[0]
+            blocks.append(self.shared_array(out_shape, out_type[1]))
+        try:
+            blocks[0][1][...] = in_data
+            specs = [(shm.name, array.shape, array.dtype)
+                     for shm, array in blocks]
+            out_spec = specs[1] if len(specs) > 1 else None
+            futures = [self._pool.submit(_run_chunk, specs[0], out_spec,
+                                         start, stop)
+                       for start, stop in self.chunk_limits(in_data.shape[0])]
+            # Results are collected in submission order
+            results = [future.result() for future in futures]
+            if out_spec is None:
+                result = pyrads.detections.Detections.concatenate(results)
+            else:
+                result = blocks[1][1].copy()
+        finally:
+            # The arrays must be dropped before closing their memory blocks
+            shms = [shm for shm, _ in blocks]
+            del blocks
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+        return result
+
+
+    def close(self):
+        """
+        Shut the worker processes down
+        """
+        self._pool.shutdown()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class ThreadExecutor():
+    """
+    Run a pipeline in a pool of threads, splitting the batch axes
+
+    The batch axes of the input, i.e. all but the signal axes of the
+    pipeline, are flattened and split in chunks that fit in cache. Every
+    thread runs its own copy of the pipeline, as the algorithms keep
+    buffers and results between calls. The copies are made again after a
+    change of the pipeline parameters.
+
+    Algorithms whose result depends on the whole cube, e.g. the 1D CFAR
+    padding with the cube mean, see a single chunk at a time.
+
+    Usable as a context manager, which shuts the pool down on exit.
+
+    @n_workers: Number of threads. By default, the number of CPUs
+    @chunk: Number of batch entries, e.g. ramps or maps, per task. By
+        default, as many as fit in CHUNK_BYTES of input
+    """
+    def __init__(self, pipeline, n_workers=None, chunk=None):
+        check_linear(pipeline)
+        self.pipeline = pipeline
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunk = chunk
+        self._local = threading.local()
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.n_workers)
+
+
+    def thread_pipeline(self, digest):
+        """
+        Return the copy of the pipeline of the current thread
+
+        The copy is made again when the digest of the pipeline has changed
+        since the last one, e.g. after a parameter change. The last outputs
+        of the algorithms are not copied.
+        """
+        if getattr(self._local, "digest", None) != digest:
+            self._local.pipeline = self.pipeline.replica()
+            self._local.digest = digest
+        return self._local.pipeline
+
+
+    def n_signal_dims(self, in_data):
+        """
+        Number of trailing axes that are not split
+        """
+        n_signal_dims = max(alg.n_signal_dims
+                            for alg in self.pipeline._algorithms.values())
+        return min(n_signal_dims, in_data.ndim)
+
+
+    def chunk_limits(self, units):
+        """
+        Return the first and last batch entry of every task
+        """
+        chunk = self.chunk
+        if chunk is None:
+            unit_bytes = max(1, units[:1].nbytes)
+            chunk = max(1, CHUNK_BYTES // unit_bytes)
+        return [(start, min(start+chunk, units.shape[0]))
+                for start in range(0, units.shape[0], chunk)]
+
+
+    def _run_chunk(self, digest, units, out_units, start, stop):
+        """
+        Run the thread pipeline on a chunk of batch entries
+        """
+        result = run_final(self.thread_pipeline(digest), units[start:stop])
+        if out_units is None:
+            return result
+        out_units[start:stop] = result
+        return None
+
+
+    def __call__(self, in_data):
+        """
+        Run the pipeline over all the batch entries, return the final output
+        """
+        n_batch_dims = in_data.ndim - self.n_signal_dims(in_data)
+        batch_shape = in_data.shape[:n_batch_dims]
+        units = in_data.reshape((-1,) + in_data.shape[n_batch_dims:])
+        digest = self.pipeline.digest()
+        # Run the first entry here, to know the type of the output
+        sample = run_final(self.pipeline, units[:1])
+        out_units = None
+        if isinstance(sample, np.ndarray):
+            out_units = np.empty(units.shape[:1] + sample.shape[1:],
+                                 dtype=sample.dtype)
+        futures = [self._pool.submit(self._run_chunk, digest, units,
+                                     out_units, start, stop)
+                   for start, stop in self.chunk_limits(units)]
+        results = [future.result() for future in futures]
+        if out_units is not None:
+            return out_units.reshape(batch_shape + sample.shape[1:])
+        # Detections have the same flat indices with or without the
+        # flattened batch axes
+        detections = pyrads.detections.Detections.concatenate(results)
+        flat_index = np.ravel_multi_index(detections.coords, detections.shape)
+        result = pyrads.detections.Detections.from_flat_index(
+            flat_index, batch_shape + detections.shape[1:],
+            detections.power, detections.margin)
+        return result
+
+
+    def close(self):
+        """
+        Shut the worker threads down
+        """
+        self._pool.shutdown()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class StageExecutor():
+    """
+    Run every algorithm of a pipeline in its own thread
+
+    The stages are connected by bounded queues. A stage waits when the
+    queue to the next one is full, so a slow stage holds back the frames
+    before it instead of accumulating them in memory. Each stage has a
+    single thread and the queues are FIFO, so the frames leave in the
+    order they came in.
+
+    Algorithms with reuse_buffers overwrite their output on every call,
+    so their outputs are copied before being passed to the next stage.
+
+    @queue_size: Maximum number of frames waiting before every stage
+    """
+    def __init__(self, pipeline, queue_size=2):
+        check_linear(pipeline)
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.latencies = []
+        self.stage_stats = {}
+        self._stop = threading.Event()
+
+
+    def _feed(self, frames, out_queue):
+        """
+        Put the frames in the first queue, with their arrival time
+        """
+        try:
+            for frame_n, frame in enumerate(frames):
+                if self._stop.is_set():
+                    break
+                out_queue.put((frame_n, time.perf_counter(), frame))
+        except Exception as error:
+            out_queue.put((None, None, error))
+        finally:
+            out_queue.put(_STOP)
+
+
+    def _run_stage(self, name, alg, in_queue, out_queue):
+        """
+        Process the frames of a queue with an algorithm until the end mark
+        """
+        stats = self.stage_stats[name]
+        while True:
+            try:
+                item = in_queue.get(timeout=0.01)
+            except queue.Empty:
+                # The end mark may have been drained by a shutdown
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _STOP:
+                out_queue.put(item)
+                return
+            # Number of frames waiting, including the one just taken
+            stats["queue_depth"].append(in_queue.qsize() + 1)
+            frame_n, arrival, data = item
+            if not isinstance(data, Exception):
+                start = time.perf_counter()
+                try:
+                    data = alg(data)
+                    if alg.reuse_buffers:
+                        data = data.copy()
+                except Exception as error:
+                    data = error
+                stats["busy_time"] += time.perf_counter() - start
+            out_queue.put((frame_n, arrival, data))
+
+
+    def _shutdown(self, threads, queues):
+        """
+        Stop the feeder and drain the queues until all threads are done
+        """
+        self._stop.set()
+        while any(thread.is_alive() for thread in threads):
+            for stage_queue in queues:
+                try:
+                    while True:
+                        stage_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            for thread in threads:
+                thread.join(timeout=0.001)
+
+
+    def stream(self, frames):
+        """
+        Process an iterable of frames, yielding the final outputs in order
+
+        The items of the iterable can be single frames or chunks of
+        frames. An exception raised by a stage is raised here, after
+        stopping all the stages.
+        """
+        algorithms = self.pipeline._algorithms
+        queues = [queue.Queue(maxsize=self.queue_size)
+                  for _ in range(len(algorithms) + 1)]
+        self.latencies = []
+        self.stage_stats = {
+            name: {"busy_time": 0.0, "queue_depth": []}
+            for name in algorithms
+        }
+        self._stop.clear()
+        threads = [threading.Thread(target=self._feed,
+                                    args=(frames, queues[0]), daemon=True)]
+        for stage_n, (name, alg) in enumerate(algorithms.items()):
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(name, alg, queues[stage_n], queues[stage_n+1]),
+                daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _STOP:
+                    break
+                _, arrival, result = item
+                if isinstance(result, Exception):
+                    raise result
+                self.latencies.append(time.perf_counter() - arrival)
+                yield result
+        finally:
+            self._shutdown(threads, queues)
+
+
+    def stats(self):
+        """
+        Return the frame latencies and the stage statistics of the last run
+
+        Latencies are in seconds, from the arrival of a frame to the
+        output of the last stage. The queue depth is the number of frames
+        waiting before a stage when it takes a new one.
+        """
+        latencies = np.array(self.latencies)
+        report = {
+            "n_frames": latencies.size,
+            "latency_mean": latencies.mean() if latencies.size else 0.0,
+            "latency_p95": np.percentile(latencies, 95) if latencies.size else 0.0,
+            "latency_max": latencies.max() if latencies.size else 0.0,
+            "stages": {},
+        }
+        for name, stats in self.stage_stats.items():
+            depth = np.array(stats["queue_depth"])
+            report["stages"][name] = {
+                "busy_time": stats["busy_time"],
+                "queue_depth_mean": depth.mean() if depth.size else 0.0,
+                "queue_depth_max": int(depth.max()) if depth.size else 0,
+            }
+        return report
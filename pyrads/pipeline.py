@@ -4,19 +4,60 @@ Module containing the base pipeline class
 """
 # Standard libraries
 from abc import ABC, abstractmethod
+import asyncio
+import collections
+import copy
+import hashlib
+import logging
 import numpy as np
 # Local libraries
 import pyrads.algorithm
+import pyrads.algms.fused
+import pyrads.cache
+import pyrads.utils.profiler
 
 
 class Pipeline():
     """
     Parent class for radar algorithms
+
+    Retention policies, i.e. the outputs returned by a run:
+        'all': list with the input and the output of every stage (default)
+        'final': output of the last stage only
+        list of algorithm names: dictionary with the outputs of those
+            stages and of the last stage, keyed by name
+        'lazy': LazyResult, which only runs the stages needed for the
+            outputs and frames that are indexed
+
+    Unless all stages are retained, every intermediate output is released
+    once the next stage has consumed it.
+
+    With a pyrads.cache.ResultCache as cache, the stages are only run
+    after the longest prefix of the chain whose outputs are cached for the
+    same input and parameters. The outputs of a run are then read-only,
+    and the stages that are not run keep the state of their last run.
     """
-    def __init__(self, chain=[], dataset=""):
+    RETAIN_POLICIES = ("all", "final", "lazy")
+
+    def __init__(self, chain=[], dataset="", dtype=None, retain="all",
+                 cache=None):
         self._algorithms = {}
+        # Precision given to the algorithms that do not set their own
+        self.dtype = dtype
+        if isinstance(retain, str) and retain not in self.RETAIN_POLICIES:
+            raise ValueError("Invalid retention policy: {}".format(retain))
+        self.retain = retain
+        # Optional pyrads.cache.ResultCache of the stage outputs
+        self.cache = cache
         self._in_data = np.array([])
         self.output = np.array([])
+        # Idle copies of the pipeline for the asynchronous runs, with the
+        # digest of the pipeline they were made from
+        self._idle_replicas = []
+        # Names of the algorithms fused by compile
+        self.fused = []
+        # Profiler attached to the stages, if any
+        self.profiler = None
 
         if len(dataset) > 0:
             self.add_data(dataset)
@@ -29,9 +70,12 @@ class Pipeline():
         pass
 
 
-    def __check_shape(self, in_shape):
+    def __check_shape(self, algorithm):
         """
-        Check that input shape matches the last element of the pipeline
+        Check that the algorithm input matches the last element of the pipeline
+
+        Only the signal axes of the algorithm are compared, so the batch
+        axes may differ between algorithms.
         """
         # If there already are algorithms, use the last one as reference
         if len(self._algorithms) > 0:
@@ -41,8 +85,8 @@ class Pipeline():
             cur_out_data_shape = self._in_data.shape
         # Otherwise, ignore the check
         else:
-            cur_out_data_shape = in_shape
-        check = True if in_shape == cur_out_data_shape else False
+            cur_out_data_shape = algorithm.in_data_shape
+        check = algorithm.accepts(cur_out_data_shape)
         return check
 
 
@@ -59,31 +103,319 @@ class Pipeline():
                 raise TypeError("Input type invalid: {}".format(type(element)))
 
 
-    def _add_algorithm(self, algorithm):
+    def _add_algorithm(self, algorithm, name=None):
         """
         Add an algorithm to the processing chain
+
+        By default, the algorithm is named after its NAME, with a suffix
+        if the name is already taken, e.g. 'FFT_1' for a second FFT.
         """
         # Test that the input data format is compatible with the previous one
-        assert self.__check_shape(algorithm.in_data_shape)
+        assert self.__check_shape(algorithm)
+        if self.dtype is not None and algorithm.dtype is None:
+            algorithm.set_dtype(self.dtype)
+        if name is None:
+            name = self.unique_name(algorithm.NAME)
         # Add algorithm to the list
-        self._algorithms[algorithm.NAME] = algorithm
+        self._algorithms[name] = algorithm
+        self._idle_replicas = []
+
+
+    def unique_name(self, name):
+        """
+        Return the name, with the first free numeric suffix if it is taken
+        """
+        unique = name
+        n = 1
+        while unique in self._algorithms:
+            unique = "{}_{}".format(name, n)
+            n += 1
+        return unique
 
 
     def _run(self, in_data):
         # Check data shape fits the 1st algorithm in_shape
-        if in_data.shape != [*self._algorithms.values()][0].in_data_shape:
+        if not [*self._algorithms.values()][0].accepts(in_data.shape):
             raise ValueError(
                 "Input shape {} does not match with input algorithm shape {}"
                 "".format(in_data.shape, [*self._algorithms.values()][0].in_data_shape))
-        # List with data at all stages of the pipeline
-        pipe_data = [in_data]
-        # Run algorithms iteratively. Each algorithm uses output data from
-        # previous algorithm
-        for alg in self._algorithms.values():
-            pipe_data.append(alg(pipe_data[-1]))
+        if self.retain == "lazy":
+            return LazyResult(self, in_data)
+        if isinstance(self.retain, str):
+            taps = ()
+        else:
+            taps = tuple(self.retain)
+        for name in taps:
+            if name not in self._algorithms:
+                raise ValueError("Unknown tap: {}".format(name))
+        if self.cache is None:
+            keys, cached = [], []
+        elif self.retain == "all":
+            keys, cached = self._cached_prefix(in_data, self._algorithms)
+        else:
+            keys, cached = self._cached_prefix(in_data, taps)
+        stages = [*self._algorithms.items()]
+        if self.retain == "all":
+            # List with data at all stages of the pipeline
+            pipe_data = [in_data] + cached
+            # Run algorithms iteratively. Each algorithm uses output data
+            # from previous algorithm
+            for n, (_, alg) in enumerate(stages[len(cached):], len(cached)):
+                pipe_data.append(alg(pipe_data[-1]))
+                if self.cache is not None:
+                    self._cache_output(keys[n], alg, pipe_data[-2], pipe_data[-1])
+            return pipe_data
+        pipe_data = {}
+        for (name, _), data in zip(stages, cached):
+            if name in taps:
+                pipe_data[name] = data
+        data = cached[-1] if cached else in_data
+        prev_alg = None
+        for n, (name, alg) in enumerate(stages[len(cached):], len(cached)):
+            prev_data = data
+            data = alg(data)
+            if self.cache is not None:
+                self._cache_output(keys[n], alg, prev_data, data)
+            if name in taps:
+                pipe_data[name] = data
+            # The previous output is no longer needed
+            if prev_alg is not None:
+                prev_alg.release()
+            prev_alg = alg
+        if self.retain == "final":
+            return data
+        pipe_data[stages[-1][0]] = data
         return pipe_data
 
 
+    def _cached_prefix(self, in_data, needed):
+        """
+        Return the cache keys of all the stages and the cached outputs of
+        the longest prefix of the chain
+
+        The outputs of the prefix stages not in needed are None, except
+        the last one. If a needed output is no longer cached, the prefix
+        is empty.
+        """
+        keys = pyrads.cache.chain_keys(in_data, self._algorithms.values())
+        names = [*self._algorithms]
+        for n_cached in range(len(keys), 0, -1):
+            last = self.cache.get(keys[n_cached-1])
+            if last is not None:
+                break
+        else:
+            return keys, []
+        cached = [None] * (n_cached-1) + [last]
+        for n in range(n_cached-1):
+            if names[n] in needed:
+                cached[n] = self.cache.get(keys[n])
+                if cached[n] is None:
+                    return keys, []
+        return keys, cached
+
+
+    def _cache_output(self, key, alg, in_data, out_data):
+        """
+        Store the output of a stage in the cache
+
+        Outputs that are reused by the algorithm or that share memory with
+        the input, e.g. when working in place, are copied.
+        """
+        shared = (isinstance(in_data, np.ndarray)
+                  and isinstance(out_data, np.ndarray)
+                  and np.may_share_memory(in_data, out_data))
+        if alg.reuse_buffers or shared:
+            out_data = copy.deepcopy(out_data)
+        self.cache.put(key, out_data)
+
+
+    def stream(self, frames, chunk=None):
+        """
+        Process an iterable of frames lazily, yielding a result per chunk
+
+        The iterable can yield single frames or blocks of frames along the
+        first axis, e.g. slices of an HDF5 dataset. Frames are grouped in
+        chunks of frames, so memory does not depend on the length of the
+        recording. The last chunk may be shorter.
+
+        Every chunk is a separate run, so algorithms whose result depends
+        on the whole input, e.g. the 1D CFAR padding with the input mean,
+        see a single chunk at a time.
+
+        @chunk: Number of frames per chunk. By default, the size of the
+            first axis of the pipeline input shape
+        """
+        in_shape = [*self._algorithms.values()][0].in_data_shape
+        if chunk is None:
+            chunk = in_shape[0]
+        frame_shape = in_shape[1:]
+        buffer = None
+        n_frames = 0
+        for block in frames:
+            block = np.asarray(block)
+            if block.shape == frame_shape:
+                block = block[np.newaxis]
+            elif block.shape[1:] != frame_shape:
+                raise ValueError(
+                    "Frame shape {} does not match with pipeline frame shape {}"
+                    "".format(block.shape, frame_shape))
+            while block.shape[0] > 0:
+                if buffer is None:
+                    # A new buffer per chunk, as results may refer to it
+                    buffer = np.empty((chunk,) + frame_shape, dtype=block.dtype)
+                    n_frames = 0
+                n_copy = min(chunk - n_frames, block.shape[0])
+                buffer[n_frames:n_frames+n_copy] = block[:n_copy]
+                block = block[n_copy:]
+                n_frames += n_copy
+                if n_frames == chunk:
+                    yield self(buffer)
+                    buffer = None
+        if buffer is not None:
+            yield self(buffer[:n_frames])
+
+
+    def compile(self):
+        """
+        Return a pipeline in which runs of fusible algorithms are fused
+
+        Consecutive algorithms with FUSIBLE set are replaced by one
+        pyrads.algms.fused.Fused algorithm, which goes over the data once.
+        Algorithms retained as taps are left out of the fusion, and the
+        other algorithms keep their names. The names of the fused
+        algorithms are listed in the fused attribute of the new pipeline,
+        and their intermediate outputs are not returned. Both pipelines
+        share the algorithms, so later parameter changes apply to both.
+        """
+        taps = () if isinstance(self.retain, str) else tuple(self.retain)
+        pipeline = Pipeline(dtype=self.dtype, retain=self.retain,
+                            cache=self.cache)
+        fused = []
+        fusible_run = []
+        for name, alg in [*self._algorithms.items(), (None, None)]:
+            if alg is not None and alg.FUSIBLE and name not in taps:
+                fusible_run.append((name, alg))
+                continue
+            if len(fusible_run) > 1:
+                pipeline._add_algorithm(pyrads.algms.fused.Fused(
+                    [fused_alg for _, fused_alg in fusible_run]))
+                fused.append([fused_name for fused_name, _ in fusible_run])
+            else:
+                for fused_name, fused_alg in fusible_run:
+                    pipeline._add_algorithm(fused_alg, fused_name)
+            fusible_run = []
+            if alg is not None:
+                pipeline._add_algorithm(alg, name)
+        pipeline.fused = fused
+        for names in fused:
+            logging.info("Fused stages: {}".format(", ".join(names)))
+        return pipeline
+
+
+    def profile(self, memory=False):
+        """
+        Attach a new profiler to all the stages and return it
+
+        The profiler is shared with the replicas of the pipeline. Call
+        its detach method to remove the instrumentation.
+
+        @memory: if True, track the peak allocation of every stage
+        """
+        if self.profiler is not None:
+            self.profiler.detach()
+        return pyrads.utils.profiler.Profiler(memory).attach(self)
+
+
+    def replica(self):
+        """
+        Return an independent copy of the pipeline
+
+        The last outputs of the pipeline and its algorithms are not copied,
+        and the profiler and the cache are shared.
+        """
+        memo = {id(alg.output): None for alg in self._algorithms.values()}
+        memo[id(self.output)] = None
+        memo[id(self._idle_replicas)] = []
+        memo[id(self.profiler)] = self.profiler
+        memo[id(self.cache)] = self.cache
+        return copy.deepcopy(self, memo)
+
+
+    def digest(self):
+        """
+        Return a hash of the pipeline settings and of the names and
+        parameters of its algorithms
+
+        Copies made with replica give the same results as the pipeline
+        as long as its digest does not change.
+        """
+        digest = hashlib.sha256(repr((self.retain, self.dtype)).encode())
+        for name, alg in self._algorithms.items():
+            digest.update(name.encode())
+            digest.update(pyrads.cache.algorithm_digest(alg).encode())
+        return digest.hexdigest()
+
+
+    async def arun(self, in_data, timeout=None, executor=None):
+        """
+        Run the pipeline in an executor without blocking the event loop
+
+        Every run takes an idle copy of the pipeline, so concurrent runs
+        do not share the state of the algorithms. Idle copies made before
+        a change of the parameters are dropped. When the timeout expires
+        or the run is cancelled, the computation already started still
+        ends in the background.
+
+        @timeout: Maximum time in seconds, or None to wait indefinitely
+        @executor: concurrent.futures executor. By default, the default
+            executor of the event loop
+        """
+        loop = asyncio.get_running_loop()
+        digest = self.digest()
+        self._idle_replicas = [idle for idle in self._idle_replicas
+                               if idle[0] == digest]
+        if self._idle_replicas:
+            _, replica = self._idle_replicas.pop()
+        else:
+            replica = self.replica()
+
+        def run():
+            try:
+                return replica(in_data)
+            finally:
+                self._idle_replicas.append((digest, replica))
+
+        result = await asyncio.wait_for(
+            loop.run_in_executor(executor, run), timeout)
+        return result
+
+
+    async def astream(self, frames, max_in_flight=1, timeout=None,
+                      executor=None):
+        """
+        Process frames from an async or regular iterable, yielding results
+
+        Up to max_in_flight frames are processed at the same time, and the
+        results come out in the order of the frames. The timeout applies to
+        each frame, and its expiry raises asyncio.TimeoutError. Stopping
+        the iteration cancels the frames in flight.
+        """
+        if not hasattr(frames, "__aiter__"):
+            frames = _async_frames(frames)
+        in_flight = collections.deque()
+        try:
+            async for frame in frames:
+                in_flight.append(asyncio.ensure_future(
+                    self.arun(frame, timeout, executor)))
+                if len(in_flight) >= max_in_flight:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+
     def __getitem__(self, key):
         val = dict.__getitem__(self._algorithms, key)
         return val
@@ -105,3 +437,118 @@ class Pipeline():
     def __call__(self, in_data):
         self.output = self._run(in_data)
         return self.output
+
+
+class LazyResult():
+    """
+    Outputs of a pipeline run, computed when they are indexed
+
+    Indexing works like the list returned with the 'all' policy, with 0
+    for the input and n for the output of the nth stage, or with the name
+    of a stage. Only the stages up to the indexed one are run, with their
+    parameters at that time, and their outputs are kept for later
+    indexing. The stages receive read-only inputs, so in-place algorithms
+    do not change the kept outputs. The cache of the pipeline is not used.
+
+    A second index selects frames along the first axis, and only these
+    frames are computed, e.g. result['FFT', 3] or result[-1, 10:20]. An
+    integer frame drops the axis. Stages using statistics of the whole
+    input, like the padding of the 1D CFAR or the unitary FFT format,
+    compute them over the selected frames only.
+    """
+    def __init__(self, pipeline, in_data):
+        self.pipeline = pipeline
+        self.in_data = in_data
+        self.names = [*pipeline._algorithms]
+        self.algorithms = [*pipeline._algorithms.values()]
+        # Outputs by stage position and frame range, None for all frames
+        self._outputs = {}
+
+
+    def position(self, stage):
+        """
+        Return the position of a stage given by its name or index
+        """
+        if isinstance(stage, str):
+            if stage not in self.names:
+                raise KeyError("Unknown stage: {}".format(stage))
+            return self.names.index(stage) + 1
+        if not -len(self) <= stage < len(self):
+            raise IndexError("Stage index out of range: {}".format(stage))
+        return stage % len(self)
+
+
+    def frame_range(self, frames):
+        """
+        Return the frames as (start, stop, step), or None for all frames
+        """
+        n_frames = self.in_data.shape[0]
+        if frames is None:
+            return None
+        if isinstance(frames, slice):
+            frame_range = frames.indices(n_frames)
+            return None if frame_range == (0, n_frames, 1) else frame_range
+        if not -n_frames <= frames < n_frames:
+            raise IndexError("Frame index out of range: {}".format(frames))
+        frame = frames % n_frames
+        return (frame, frame+1, 1)
+
+
+    def output(self, position, frame_range=None):
+        """
+        Return the output of a stage, running the stages it depends on
+        """
+        key = (position, frame_range)
+        if key in self._outputs:
+            return self._outputs[key]
+        full = self._outputs.get((position, None))
+        if frame_range is not None and isinstance(full, np.ndarray):
+            # Frames of an output computed for all frames
+            return full[slice(*frame_range)]
+        if position == 0:
+            data = self.in_data
+            if frame_range is not None:
+                data = data[slice(*frame_range)]
+        else:
+            in_data = self.output(position-1, frame_range)
+            if isinstance(in_data, np.ndarray):
+                in_data = in_data.view()
+                in_data.flags.writeable = False
+            alg = self.algorithms[position-1]
+            data = alg(in_data)
+            # Reused buffers are overwritten by the next run of the stage
+            if alg.reuse_buffers:
+                data = copy.deepcopy(data)
+        self._outputs[key] = data
+        return data
+
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            stage, frames = key
+        else:
+            stage, frames = key, None
+        data = self.output(self.position(stage), self.frame_range(frames))
+        if isinstance(frames, (int, np.integer)) and isinstance(data, np.ndarray):
+            data = data[0]
+        return data
+
+
+    def __len__(self):
+        return len(self.algorithms) + 1
+
+
+    def __repr__(self):
+        computed = sorted({self.names[position-1] for position, _
+                           in self._outputs if position > 0},
+                          key=self.names.index)
+        return "{}(stages: {}, computed: {})".format(
+            type(self).__name__, self.names, computed)
+
+
+async def _async_frames(frames):
+    """
+    Iterate over a regular iterable as an asynchronous one
+    """
+    for frame in frames:
+        yield frame
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling of pipelines
+
+The profiler is attached to the stage hooks of the algorithms, so a
+pipeline without profiler runs no instrumentation code at all.
+"""
+# Standard libraries
+import functools
+import json
+import threading
+import time
+import tracemalloc
+# Local libraries
+
+
+class Profiler():
+    """
+    Aggregate time, data size and memory statistics per stage
+
+    Every call of a stage records the wall time, the CPU time of the
+    process, the bytes of its input and output and the number of frames,
+    i.e. the size of the first input axis. The CPU time includes the
+    threads of other stages running at the same time.
+
+    @memory: if True, the peak allocation of each stage is tracked with
+        tracemalloc. Tracing slows down the allocations, so it is off by
+        default
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.pipeline = None
+        self.algorithms = []
+        self.stage_stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+
+
+    def attach(self, pipeline):
+        """
+        Add the profiler hooks to all the algorithms of a pipeline
+        """
+        for name, alg in pipeline._algorithms.items():
+            # The stages are reported with their names in the pipeline
+            post_stage = functools.partial(self.post_stage, name=name)
+            alg.pre_hooks.append(self.pre_stage)
+            alg.post_hooks.append(post_stage)
+            self.algorithms.append((alg, post_stage))
+        pipeline.profiler = self
+        self.pipeline = pipeline
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+
+    def detach(self):
+        """
+        Remove the profiler hooks, keeping the recorded statistics
+        """
+        for alg, post_stage in self.algorithms:
+            alg.pre_hooks.remove(self.pre_stage)
+            alg.post_hooks.remove(post_stage)
+        self.algorithms = []
+        if self.pipeline is not None and self.pipeline.profiler is self:
+            self.pipeline.profiler = None
+        self.pipeline = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+
+    def reset(self):
+        """
+        Clear the recorded statistics
+        """
+        with self._lock:
+            self.stage_stats = {}
+
+
+    def pre_stage(self, alg, in_data):
+        """
+        Hook called before a stage runs
+        """
+        if not hasattr(self._local, "starts"):
+            self._local.starts = []
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        else:
+            memory = None
+        self._local.starts.append(
+            (time.perf_counter(), time.process_time(), memory))
+
+
+    def post_stage(self, alg, in_data, out_data, name=None):
+        """
+        Hook called after a stage runs
+
+        @name: Name of the stage in the report. By default, its NAME
+        """
+        wall_end = time.perf_counter()
+        cpu_end = time.process_time()
+        wall_start, cpu_start, memory = self._local.starts.pop()
+        peak_bytes = None
+        if memory is not None and tracemalloc.is_tracing():
+            peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - memory)
+        with self._lock:
+            stats = self.stage_stats.setdefault(name or alg.NAME, {
+                "calls": 0,
+                "frames": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "peak_bytes": None,
+            })
+            stats["calls"] += 1
+            stats["frames"] += in_data.shape[0] if in_data.ndim > 0 else 1
+            stats["wall_time"] += wall_end - wall_start
+            stats["cpu_time"] += cpu_end - cpu_start
+            stats["bytes_in"] += getattr(in_data, "nbytes", 0)
+            stats["bytes_out"] += getattr(out_data, "nbytes", 0)
+            if peak_bytes is not None:
+                stats["peak_bytes"] = max(stats["peak_bytes"] or 0, peak_bytes)
+
+
+    def report(self):
+        """
+        Return the statistics per stage and for the whole pipeline
+
+        Times are in seconds. The pipeline throughput counts the frames
+        entering the first stage over the time spent in all stages.
+        """
+        with self._lock:
+            stage_stats = {name: dict(stats)
+                           for name, stats in self.stage_stats.items()}
+        report = {"stages": stage_stats}
+        for stats in stage_stats.values():
+            stats["frames_per_s"] = (stats["frames"] / stats["wall_time"]
+                                     if stats["wall_time"] > 0 else 0.0)
+        wall_time = sum(stats["wall_time"] for stats in stage_stats.values())
+        first_stage = next(iter(stage_stats.values()), None)
+        frames = first_stage["frames"] if first_stage is not None else 0
+        peaks = [stats["peak_bytes"] for stats in stage_stats.values()
+                 if stats["peak_bytes"] is not None]
+        report["total"] = {
+            "frames": frames,
+            "wall_time": wall_time,
+            "cpu_time": sum(stats["cpu_time"] for stats in stage_stats.values()),
+            "peak_bytes": max(peaks) if peaks else None,
+            "frames_per_s": frames / wall_time if wall_time > 0 else 0.0,
+        }
+        return report
+
+
+    def to_json(self, path=None, **kwargs):
+        """
+        Return the report as a JSON string, and write it to path if given
+
+        Extra keyword arguments are passed to json.dumps, e.g. indent.
+        """
+        text = json.dumps(self.report(), **kwargs)
+        if path is not None:
+            with open(path, "w") as json_file:
+                json_file.write(text)
+        return text
+
+
+    def __str__(self):
+        """
+        Return the report as a table
+        """
+        report = self.report()
+        header = "{:<24}{:>7}{:>11}{:>11}{:>11}{:>11}{:>11}{:>12}".format(
+            "Stage", "Calls", "Wall (ms)", "CPU (ms)", "In (MiB)",
+            "Out (MiB)", "Peak (MiB)", "Frames/s")
+        lines = [header, "-" * len(header)]
+        rows = [*report["stages"].items(), ("Total", report["total"])]
+        for name, stats in rows:
+            peak = stats["peak_bytes"]
+            lines.append(
+                "{:<24}{:>7}{:>11.2f}{:>11.2f}{:>11}{:>11}{:>11}{:>12.1f}".format(
+                    name,
+                    stats.get("calls", ""),
+                    stats["wall_time"] * 1e3,
+                    stats["cpu_time"] * 1e3,
+                    _mib(stats.get("bytes_in")),
+                    _mib(stats.get("bytes_out")),
+                    _mib(peak),
+                    stats["frames_per_s"]))
+        return "\n".join(lines)
+
+
+    def __getstate__(self):
+        # Locks cannot be copied to other processes
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_local"]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+def _mib(n_bytes):
+    """
+    Format a number of bytes in MiB, or an empty field if unknown
+    """
+    if n_bytes is None:
+        return ""
+    return "{:.2f}".format(n_bytes / 2**20)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Synthetic FMCW radar data
+
+Generates raw ADC cubes with the layout of the recorded datasets,
+(n_frames, tx_antennas, rx_antennas, n_ramps, n_samples), so that the
+algorithms can be run and benchmarked without them.
+"""
+# Standard libraries
+import numpy as np
+# Local libraries
+
+
+def fmcw_frames(frame_shape=(1, 4, 128, 256), n_frames=1, targets=(),
+                noise=0.01, clutter=0.0, n_clutter=32, offset=0.0,
+                seed=None, dtype=float):
+    """
+    Yield the frames of a scene with point targets, clutter and noise
+
+    Every target is a dictionary with the keys:
+        'range': beat frequency, in range FFT bins
+        'velocity': Doppler frequency, in Doppler FFT bins. Positive and
+            negative values are placed on each side of the zero Doppler
+            bin of the shifted range-Doppler map (default 0)
+        'angle': angle of arrival in degrees, for a uniform array of
+            virtual antennas at half a wavelength (default 0)
+        'amplitude': peak amplitude of the beat signal (default 1)
+        'phase': initial phase in radians (default 0)
+    Frames are consecutive in time, so the Doppler phase of the targets
+    continues from one frame to the next. Targets do not move in range.
+
+    @frame_shape: (tx_antennas, rx_antennas, n_ramps, n_samples)
+    @noise: Standard deviation of the white Gaussian noise
+    @clutter: Scale of the Rayleigh amplitudes of the static clutter
+    @n_clutter: Number of static scatterers at random ranges and angles
+    @offset: Constant added to all samples, like the ADC DC offset
+    @seed: Seed of the random generator, for reproducible frames
+    """
+    n_tx, n_rx, n_ramps, n_samples = frame_shape
+    rng = np.random.default_rng(seed)
+    scatterers = [dict(target) for target in targets]
+    if clutter > 0:
+        ranges = rng.uniform(1, n_samples // 2 - 1, n_clutter)
+        angles = rng.uniform(-90, 90, n_clutter)
+        amplitudes = rng.rayleigh(clutter, n_clutter)
+        phases = rng.uniform(0, 2*np.pi, n_clutter)
+        scatterers += [
+            {"range": r, "angle": a, "amplitude": amp, "phase": ph}
+            for r, a, amp, ph in zip(ranges, angles, amplitudes, phases)]
+
+    # The beat signal of every scatterer is separable into a tone along
+    # the samples, along the ramps and along the virtual antennas
+    sample_n = np.arange(n_samples) / n_samples
+    ramp_n = np.arange(n_ramps) / n_ramps
+    antenna_n = np.arange(n_tx*n_rx)
+    range_bins = np.array([s["range"] for s in scatterers], dtype=float)
+    velocity_bins = np.array([s.get("velocity", 0) for s in scatterers],
+                             dtype=float)
+    angles = np.radians([s.get("angle", 0) for s in scatterers])
+    amplitudes = np.array([s.get("amplitude", 1) for s in scatterers],
+                          dtype=float)
+    phases = np.array([s.get("phase", 0) for s in scatterers], dtype=float)
+    sample_tones = np.exp(2j*np.pi*np.outer(range_bins, sample_n))
+    ramp_tones = np.exp(2j*np.pi*np.outer(velocity_bins, ramp_n))
+    antenna_tones = np.exp(1j*np.pi*np.outer(np.sin(angles), antenna_n))
+
+    for frame_n in range(n_frames):
+        frame_phase = np.exp(1j*(phases + 2*np.pi*velocity_bins*frame_n))
+        frame = np.einsum("t,tk,tm,tn->kmn", amplitudes*frame_phase,
+                          antenna_tones, ramp_tones, sample_tones,
+                          optimize=True).real
+        frame = frame.reshape(frame_shape)
+        if noise > 0:
+            frame += rng.normal(0, noise, frame_shape)
+        frame += offset
+        yield frame.astype(dtype, copy=False)
+
+
+def fmcw_cube(shape=(1, 1, 4, 128, 256), **kwargs):
+    """
+    Return a cube of synthetic frames
+
+    @shape: (n_frames, tx_antennas, rx_antennas, n_ramps, n_samples)
+    Other keyword arguments are the ones of fmcw_frames.
+    """
+    dtype = kwargs.get("dtype", float)
+    cube = np.empty(shape, dtype=dtype)
+    frames = fmcw_frames(shape[1:], n_frames=shape[0], **kwargs)
+    for frame_n, frame in enumerate(frames):
+        cube[frame_n] = frame
+    return cube
+
+
+def random_targets(n_targets, frame_shape=(1, 4, 128, 256), amplitude=1.0,
+                   seed=None):
+    """
+    Return point targets at random ranges, velocities and angles
+
+    Targets are kept away from the zero range bin and from the edges of
+    the Doppler axis.
+    """
+    n_ramps, n_samples = frame_shape[-2:]
+    rng = np.random.default_rng(seed)
+    targets = []
+    for _ in range(n_targets):
+        targets.append({
+            "range": rng.uniform(2, n_samples // 2 - 2),
+            "velocity": rng.uniform(-n_ramps // 2 + 2, n_ramps // 2 - 2),
+            "angle": rng.uniform(-60, 60),
+            "amplitude": amplitude,
+            "phase": rng.uniform(0, 2*np.pi),
+        })
+    return targets